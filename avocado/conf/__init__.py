@@ -43,6 +43,10 @@ def test_setting_changed_handler(**kwargs):
     elif kwargs['setting'].startswith('AVOCADO_'):
         key = kwargs['setting'][8:]
         value = kwargs['value']
+        # The override has been removed, so the configured value is restored
+        if not hasattr(django_settings, kwargs['setting']):
+            value = getattr(django_settings, 'AVOCADO', {}).get(key,
+                getattr(global_settings, key, None))
         setattr(settings._wrapped, key, value)
 
 
@@ -113,14 +117,21 @@ class Haystack(Dependency):
             return False
 
 
-#class Numpy(Dependency):
-#    name = 'numpy'
-#
-#    def test_install(self):
-#        try:
-#            import numpy
-#        except ImportError:
-#            return False
+class Numpy(Dependency):
+    """NumPy is used by formatters for returning numerical columns as arrays
+    when formatting rows in batches, e.g. `Formatter.format_batch`. It is also
+    a dependency of SciPy.
+
+    Install by doing `pip install numpy`.
+    """
+
+    name = 'numpy'
+
+    def test_install(self):
+        try:
+            import numpy
+        except ImportError:
+            return False
 
 
 class Scipy(Dependency):
@@ -183,7 +194,7 @@ class Guardian(Dependency):
 # features.
 OPTIONAL_DEPS = {
     'haystack': Haystack(),
-#    'numpy': Numpy(),
+    'numpy': Numpy(),
     'scipy': Scipy(),
     'openpyxl': Openpyxl(),
     'guardian': Guardian(),
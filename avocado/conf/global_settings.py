@@ -83,3 +83,101 @@ METADATA_FIXTURE_DIR = None
 METADATA_FIXTURE_SUFFIX = 'avocado_metadata'
 
 METADATA_MIGRATION_SUFFIX = 'avocado_metadata_migration'
+
+# Flag for enabling the per-process LRU cache that sits in front of the
+# Django cache backend for `cached_property` lookups. This prevents a round
+# trip to the cache backend (and unpickling) for frequently accessed data.
+LOCAL_CACHE_ENABLED = False
+
+# The maximum number of entries held in the local cache. Set to `None` (or 0)
+# to not limit by the number of entries.
+LOCAL_CACHE_MAX_ENTRIES = 100
+
+# The maximum approximate size in bytes of all the entries held in the local
+# cache. Set to `None` (or 0) to not limit by size.
+LOCAL_CACHE_MAX_SIZE = 1024 * 1024 * 50
+
+# The number of seconds the generation counters (see `avocado data
+# --generation`) are retained by each process. This prevents an additional
+# round trip to the cache backend for each cached property access, at the
+# expense of other processes seeing a new generation up to this many seconds
+# later. Set to 0 to fetch the generation on every access.
+LOCAL_GENERATION_TIMEOUT = 5
+
+# Policy for protecting against many processes computing the same cached
+# property at once, e.g. after the `data_modified` is updated. When set, a
+# lock key in the cache ensures only one process computes the data. The other
+# processes either wait for the data to be cached ('wait') or use the data
+# of the previous version if available ('stale'), otherwise they wait. Set to
+# `None` to disable.
+CACHE_STAMPEDE_POLICY = None
+
+# The number of seconds the lock is held before it expires. This prevents
+# a process that dies while computing the data from holding the lock forever.
+CACHE_LOCK_TIMEOUT = 60 * 5
+
+# The maximum number of seconds to wait for the data to be computed by
+# another process before computing it anyways.
+CACHE_LOCK_WAIT = 10
+
+# The number of seconds between checks for the data while waiting.
+CACHE_LOCK_INTERVAL = 0.1
+
+# Cached property data that is at least this number of bytes when pickled is
+# compressed before being stored. Set to `None` (or 0) to disable compression
+# and chunking.
+CACHE_COMPRESS_MIN_SIZE = 1024 * 100
+
+# The zlib compression level (1-9) used for compressing cached data.
+CACHE_COMPRESS_LEVEL = 6
+
+# The maximum number of bytes stored in a single cache entry. Compressed data
+# larger than this is split across multiple keys. This should be less than
+# the item size limit of the cache backend, e.g. 1 MB for memcached.
+CACHE_CHUNK_SIZE = 1000 * 1000
+
+# The number of rows fetched at a time when streaming the values of a field,
+# e.g. `DataField.iter_values`. Server-side cursors are used for PostgreSQL
+# and MySQL so at most this number of rows are held in memory.
+CURSOR_CHUNK_SIZE = 2000
+
+# Flag for using the approximate number of distinct values of a field,
+# `DataField.size_estimate`, in place of the exact count for `len()` and when
+# determining the heuristic flags during `init`. The estimate is derived from
+# a HyperLogLog sketch built from a streaming scan of the field's values which
+# is much faster than a `COUNT(DISTINCT)` for large tables.
+SIZE_ESTIMATE_ENABLED = False
+
+# The relative standard error of the approximate distinct count. Lower values
+# require larger sketches, e.g. 0.01 requires 16 KB. Changes only apply to
+# sketches that have not been cached yet.
+SIZE_ESTIMATE_ERROR = 0.01
+
+# Directory where the value indexes of searchable fields are stored. The
+# indexes are built using the `avocado index` command and are used by
+# `DataField.search` for fast prefix and substring queries. Fields without
+# an index for the current `data_modified` fall back to querying the table.
+# Set to `None` to disable.
+VALUE_INDEX_DIR = None
+
+# The number of processes used for formatting the rows of an export. The
+# rows are formatted in chunks by the processes and written in the order they
+# were read. Each process opens its own database connection if one is needed
+# for formatting. Set to `None` (or 1) to format the rows in the exporting
+# process.
+EXPORT_WORKERS = None
+
+# The number of rows of an export formatted at a time, column-wise. This is
+# also the number of rows sent to an export process at a time.
+EXPORT_CHUNK_SIZE = 1000
+
+# The approximate size in bytes of the chunks produced when streaming an
+# export, e.g. `CSVExporter.iter_write`. Exporters that cannot stream their
+# output hold up to this size in memory before spooling it to a temporary
+# file on disk.
+EXPORT_BUFFER_SIZE = 1024 * 64
+
+# The zlib compression level (1-9) of the data files in zip archives produced
+# by exporters, e.g. the SAS and R exporters. Set to 0 to store the files
+# uncompressed.
+EXPORT_COMPRESS_LEVEL = 0
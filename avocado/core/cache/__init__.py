@@ -1 +1,6 @@
-from .model import instance_cache_key, post_save_cache, pre_delete_uncache, cached_property, CacheQuerySet, CacheManager
+from .model import (instance_cache_key, post_save_cache, pre_delete_uncache,
+    cached_property, prefetch_cached, get_cached, set_cached, get_many_cached,
+    set_many_cached, instance_memo, close_cache, CachedProperty, CacheQuerySet,
+    CacheManager)
+from .local import LocalCache, local_cache
+from .generation import get_generation, get_generations, incr_generation
@@ -0,0 +1,103 @@
+import zlib
+import cPickle as pickle
+from avocado.conf import settings
+
+CHUNK_CACHE_KEY = '{0}-chunk-{1}'
+
+
+class CompressedValue(object):
+    "Compressed pickle of a value that fits in a single cache entry."
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        return pickle.loads(zlib.decompress(self.data))
+
+
+class ChunkManifest(object):
+    """Stored in place of a value that is split across `count` chunk keys.
+    The chunks contain the compressed pickle of the value.
+    """
+    def __init__(self, count):
+        self.count = count
+
+    def chunk_keys(self, key):
+        return [CHUNK_CACHE_KEY.format(key, i) for i in xrange(self.count)]
+
+    def load(self, chunks):
+        return pickle.loads(zlib.decompress(''.join(chunks)))
+
+
+def pack(key, value):
+    """Returns a dict of cache keys and values to be stored for `value`.
+    Values that pickle to at least `CACHE_COMPRESS_MIN_SIZE` bytes are
+    compressed and if the compressed value is larger than `CACHE_CHUNK_SIZE`
+    it is split across chunk keys with a manifest stored under `key`.
+    """
+    min_size = settings.CACHE_COMPRESS_MIN_SIZE
+    if not min_size:
+        return {key: value}
+
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(data) < min_size:
+        return {key: value}
+
+    data = zlib.compress(data, settings.CACHE_COMPRESS_LEVEL)
+    chunk_size = settings.CACHE_CHUNK_SIZE
+
+    if not chunk_size or len(data) <= chunk_size:
+        return {key: CompressedValue(data)}
+
+    chunks = [data[i:i + chunk_size] for i in xrange(0, len(data), chunk_size)]
+    manifest = ChunkManifest(len(chunks))
+
+    packed = dict(zip(manifest.chunk_keys(key), chunks))
+    packed[key] = manifest
+    return packed
+
+
+def get_many(cache, keys):
+    """Gets the values for `keys` from `cache` and unpacks compressed and
+    chunked values. A value with a missing chunk is treated as a miss.
+    """
+    found = cache.get_many(keys)
+
+    manifests = {}
+    for key, value in found.items():
+        if isinstance(value, CompressedValue):
+            found[key] = value.load()
+        elif isinstance(value, ChunkManifest):
+            manifests[key] = value
+
+    if manifests:
+        chunk_keys = []
+        for key, manifest in manifests.iteritems():
+            chunk_keys.extend(manifest.chunk_keys(key))
+
+        chunks = cache.get_many(chunk_keys)
+
+        for key, manifest in manifests.iteritems():
+            try:
+                found[key] = manifest.load([chunks[x]
+                    for x in manifest.chunk_keys(key)])
+            except KeyError:
+                del found[key]
+
+    return found
+
+
+def set_many(cache, data, timeout):
+    "Packs and sets the `data` dict of keys and values in `cache`."
+    chunks = {}
+    values = {}
+
+    for key, value in data.iteritems():
+        packed = pack(key, value)
+        values[key] = packed.pop(key)
+        chunks.update(packed)
+
+    # Chunks are stored first so a manifest never references chunks that
+    # have not been set yet
+    if chunks:
+        cache.set_many(chunks, timeout=timeout)
+    cache.set_many(values, timeout=timeout)
@@ -0,0 +1,83 @@
+import time
+from django.core.cache import cache
+from avocado.conf import settings
+
+GENERATION_CACHE_KEY = 'avocado.generation:{0}'
+GENERATION_TIMEOUT = 60 * 60 * 24 * 30 # 30 days
+
+# Generations retained by this process keyed by label. Each entry is the
+# generation and the time it expires.
+_local_generations = {}
+
+
+def generation_cache_key(label):
+    return GENERATION_CACHE_KEY.format(label)
+
+
+def _initial():
+    # The counter starts at the current time in milliseconds rather than
+    # zero. If the counter is evicted from the cache, the new counter will
+    # not collide with generations that have already been used.
+    return int(time.time() * 1000)
+
+
+def _set_local(label, generation):
+    if settings.LOCAL_GENERATION_TIMEOUT:
+        expires = time.time() + settings.LOCAL_GENERATION_TIMEOUT
+        _local_generations[label] = (generation, expires)
+
+
+def get_generations(labels):
+    """Returns a dict of the current generation for each of `labels`,
+    e.g. 'library.book'. Counters that do not exist yet are initialized.
+
+    The generations are retained by the process for
+    `LOCAL_GENERATION_TIMEOUT` seconds so looking up cached data does not
+    require an additional round trip to the cache backend.
+    """
+    generations = {}
+
+    now = time.time()
+    for label in labels:
+        entry = _local_generations.get(label)
+        if entry is not None and entry[1] > now:
+            generations[label] = entry[0]
+    labels = [label for label in labels if label not in generations]
+
+    if not labels:
+        return generations
+
+    keys = dict((generation_cache_key(label), label) for label in labels)
+    found = cache.get_many(keys.keys())
+
+    for key, label in keys.iteritems():
+        if key not in found:
+            # Another process may initialize it at the same time
+            cache.add(key, _initial(), timeout=GENERATION_TIMEOUT)
+            found[key] = cache.get(key)
+        generations[label] = found[key]
+        _set_local(label, found[key])
+    return generations
+
+
+def get_generation(label):
+    "Returns the current generation for `label`."
+    return get_generations([label])[label]
+
+
+def incr_generation(label):
+    """Increments the generation for `label`. This invalidates all cached
+    data that is versioned by this generation in constant time. Other
+    processes may use the previous generation for up to
+    `LOCAL_GENERATION_TIMEOUT` seconds.
+    """
+    key = generation_cache_key(label)
+    try:
+        generation = cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial(), timeout=GENERATION_TIMEOUT)
+        generation = cache.incr(key)
+
+    # Other processes see the new generation once their entry expires
+    _set_local(label, generation)
+    return generation
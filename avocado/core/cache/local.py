@@ -0,0 +1,130 @@
+import sys
+import threading
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+from avocado.conf import settings
+
+
+def approximate_size(obj):
+    """Returns the approximate size of `obj` in bytes. Containers are
+    traversed so the size of the items they hold are included.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += approximate_size(key) + approximate_size(value)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += approximate_size(item)
+    return size
+
+
+class LocalCache(object):
+    """Per-process least-recently-used cache which is bounded by the number
+    of entries and the approximate size (in bytes) of the entries. This
+    is used as a front for the Django cache backend to prevent a round trip
+    (and unpickling) for frequently accessed data.
+
+    Since entries are stored by reference, the values should be treated as
+    immutable by the caller.
+
+    If `max_entries` or `max_size` are not supplied, the `LOCAL_CACHE_*`
+    settings are used.
+    """
+    def __init__(self, max_entries=None, max_size=None):
+        self._max_entries = max_entries
+        self._max_size = max_size
+        self._lock = threading.RLock()
+        self.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is None:
+            return settings.LOCAL_CACHE_MAX_ENTRIES
+        return self._max_entries
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            return settings.LOCAL_CACHE_MAX_SIZE
+        return self._max_size
+
+    @property
+    def size(self):
+        "Returns the approximate size of all entries in bytes."
+        return self._size
+
+    def _evict(self):
+        "Evicts the least recently used entries until the bounds are met."
+        max_entries = self.max_entries
+        max_size = self.max_size
+
+        while self._data and ((max_entries and len(self._data) > max_entries)
+                or (max_size and self._size > max_size)):
+            key, (value, size) = self._data.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            # Re-insert to mark this entry as the most recently used
+            entry = self._data.pop(key)
+            self._data[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = approximate_size(value)
+
+        with self._lock:
+            self.delete(key)
+
+            # Do not bother storing values that would evict everything
+            # else and still not fit
+            if self.max_size and size > self.max_size:
+                return
+
+            self._data[key] = (value, size)
+            self._size += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                value, size = self._data.pop(key)
+                self._size -= size
+
+    def clear(self):
+        "Removes all entries and resets the statistics."
+        with self._lock:
+            self._data = OrderedDict()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        "Returns a dict of the hit, miss and eviction statistics."
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'size': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# Process-wide instance used by `cached_property`
+local_cache = LocalCache()
@@ -1,10 +1,30 @@
+import copy
+import time
 from django.db import models
 from django.core.cache import cache
 from django.db.models.query import QuerySet
+from avocado.conf import settings
+from .local import local_cache
+from . import chunked
+from .generation import (generation_cache_key, get_generation,
+    get_generations)
 
 NEVER_EXPIRE = 60 * 60 * 24 * 30 # 30 days
 INSTANCE_CACHE_KEY = '{0}.{1}:{2}'
 
+# Number of instances resolved per round trip by `prefetch_cached`
+PREFETCH_BATCH_SIZE = 100
+
+# Instance attribute the prefetched data is stored in
+PREFETCHED_ATTR = '_prefetched_cache'
+
+# Instance attribute for data derived from the instance that is only retained
+# for the lifetime of the instance, see `instance_memo`
+MEMO_ATTR = '_memo'
+
+# Instance attributes that are not cached with the instance itself
+TRANSIENT_ATTRS = (PREFETCHED_ATTR, MEMO_ATTR)
+
 
 def instance_cache_key(instance, label=None, version=None):
     "Creates a cache key for the instance with an optional label and token."
@@ -17,43 +37,304 @@ def instance_cache_key(instance, label=None, version=None):
     return key
 
 
-def cached_property(label, version=None, timeout=NEVER_EXPIRE):
+def instance_memo(instance):
+    """Returns a dict on `instance` for memoizing data derived from it, such
+    as expensive setup that is reused across calls. The dict is not cached
+    with the instance.
+    """
+    return instance.__dict__.setdefault(MEMO_ATTR, {})
+
+
+def close_cache():
+    """Closes the connections of the cache backend if it maintains any. They
+    are reopened on the next access. This must be done prior to forking
+    processes so they do not share a connection with the parent.
+    """
+    close = getattr(cache, 'close', None)
+    if close:
+        close()
+
+
+def get_cached(key):
+    """Gets the data stored for `key`. If the local cache is enabled, it
+    will be checked first and populated on a hit from the cache backend.
+    """
+    local = settings.LOCAL_CACHE_ENABLED
+    if local:
+        data = local_cache.get(key)
+        if data is not None:
+            return data
+    data = chunked.get_many(cache, [key]).get(key)
+    if local and data is not None:
+        local_cache.set(key, data)
+    return data
+
+
+def set_cached(key, data, timeout=NEVER_EXPIRE):
+    """Sets the data for `key` in the cache backend and the local cache.
+    Large data is compressed and split across multiple keys if necessary.
+    """
+    chunked.set_many(cache, {key: data}, timeout=timeout)
+    if settings.LOCAL_CACHE_ENABLED:
+        local_cache.set(key, data)
+
+
+def get_many_cached(keys):
+    """Gets the data stored for each of `keys` in as few round trips as
+    possible. A dict of the keys that were found is returned.
+    """
+    found = {}
+    local = settings.LOCAL_CACHE_ENABLED
+    if local:
+        for key in keys:
+            data = local_cache.get(key)
+            if data is not None:
+                found[key] = data
+        keys = [key for key in keys if key not in found]
+    if keys:
+        fetched = chunked.get_many(cache, keys)
+        if local:
+            for key, data in fetched.iteritems():
+                local_cache.set(key, data)
+        found.update(fetched)
+    return found
+
+
+def set_many_cached(data, timeout=NEVER_EXPIRE):
+    "Sets a dict of keys and data in the cache backend and the local cache."
+    chunked.set_many(cache, data, timeout=timeout)
+    if settings.LOCAL_CACHE_ENABLED:
+        for key, value in data.iteritems():
+            local_cache.set(key, value)
+
+
+class CachedProperty(property):
+    """Property that caches the output of `func` relative to the `version`
+    of the instance. The options are retained on the property so the
+    cache keys can be determined without accessing the property, e.g.
+    `prefetch_cached`.
+
+    If `generation` is defined, it refers to the label of a generation
+    counter (see `avocado.core.cache.generation`) which is folded into
+    the version. Incrementing the counter invalidates the data for all
+    instances that share the label.
+    """
+    def __init__(self, func, label, version=None, timeout=NEVER_EXPIRE,
+            generation=None):
+        self.func = func
+        self.label = label
+        self.version = version
+        self.timeout = timeout
+        self.generation = generation
+        super(CachedProperty, self).__init__(self.get, doc=func.__doc__)
+
+    def get_generation_label(self, instance):
+        if callable(self.generation):
+            return self.generation(instance)
+        label = getattr(instance, self.generation)
+        if callable(label):
+            label = label()
+        return label
+
+    def get_version(self, instance):
+        # If this is a function, pass `label' and `self` in as arguments
+        if callable(self.version):
+            return self.version(instance, label=self.label)
+        version = getattr(instance, self.version)
+        # Call if a method
+        if callable(version):
+            version = version()
+        return version
+
+    def get_key(self, instance):
+        """Returns the cache key for `instance` or `None` if the data
+        cannot be cached.
+        """
+        # Do not cache non-persisted objects
+        if not instance.pk:
+            return
+        version = self.get_version(instance)
+        # If no version is defined, the cache cannot be reliably stored
+        if version is None:
+            return
+        if self.generation:
+            label = self.get_generation_label(instance)
+            # Generation resolved by `prefetch_cached`
+            prefetched = instance.__dict__.get(PREFETCHED_ATTR)
+            key = generation_cache_key(label)
+            if prefetched and key in prefetched:
+                generation = prefetched[key]
+            else:
+                generation = get_generation(label)
+            version = '{0}-{1}'.format(version, generation)
+        return instance_cache_key(instance, label=self.label, version=version)
+
+    def get(self, instance):
+        key = self.get_key(instance)
+        if key is None:
+            return self.func(instance)
+
+        # Data resolved by `prefetch_cached`
+        prefetched = instance.__dict__.get(PREFETCHED_ATTR)
+        if prefetched and key in prefetched:
+            return prefetched[key]
+
+        data = get_cached(key)
+        if data is None:
+            data = self.compute(instance, key)
+        return data
+
+    def get_latest_key(self, instance):
+        """Returns the key which references the cache key of the most
+        recently cached version of the data.
+        """
+        return instance_cache_key(instance, label=self.label)
+
+    def get_stale(self, instance):
+        "Returns the data of the most recently cached version if available."
+        key = cache.get(self.get_latest_key(instance))
+        if key is not None:
+            return get_cached(key)
+
+    def _compute(self, instance, key):
+        data = self.func(instance)
+        # Don't bother caching if the data is None
+        if data is not None:
+            set_cached(key, data, timeout=self.timeout)
+            if settings.CACHE_STAMPEDE_POLICY:
+                cache.set(self.get_latest_key(instance), key,
+                    timeout=self.timeout)
+        return data
+
+    def compute(self, instance, key):
+        """Computes and caches the data for `instance`. If the
+        `CACHE_STAMPEDE_POLICY` setting is defined, a lock key ensures only
+        one process computes the data at a time. The other processes
+        either wait for the data to be cached ('wait') or use the data of
+        the previous version if available ('stale').
+        """
+        policy = settings.CACHE_STAMPEDE_POLICY
+        if not policy:
+            return self._compute(instance, key)
+
+        lock_key = '{0}-lock'.format(key)
+
+        if cache.add(lock_key, 1, timeout=settings.CACHE_LOCK_TIMEOUT):
+            try:
+                return self._compute(instance, key)
+            finally:
+                cache.delete(lock_key)
+
+        if policy == 'stale':
+            data = self.get_stale(instance)
+            if data is not None:
+                return data
+
+        # Wait for the process holding the lock to cache the data
+        deadline = time.time() + settings.CACHE_LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(settings.CACHE_LOCK_INTERVAL)
+            data = get_cached(key)
+            if data is not None:
+                return data
+            # Lock was released without the data being cached
+            if cache.get(lock_key) is None:
+                break
+
+        # Give up waiting and compute it here
+        return self._compute(instance, key)
+
+
+def cached_property(label, version=None, timeout=NEVER_EXPIRE, generation=None):
     "Wraps a function and caches the output indefinitely."
     def decorator(func):
-        def wrapped(self):
-            # Do not cache non-persisted objects
-            if not self.pk:
-                return func(self)
-
-            # If this is a function, pass `label' and `self` in as arguments
-            if callable(version):
-                _version = version(self, label=label)
-            else:
-                _version = getattr(self, version)
-                # Call if a method
-                if callable(_version):
-                    _version = _version()
-            # If no version is defined, the cache cannot be reliably stored
-            if _version is None:
-                data = func(self)
-            else:
-                key = instance_cache_key(self, label=label, version=_version)
-                data = cache.get(key)
-                if data is None:
-                    data = func(self)
-                    # Don't bother caching if the data is None
-                    if data is not None:
-                        cache.set(key, data, timeout=timeout)
-            return data
-        return property(wrapped)
+        return CachedProperty(func, label, version=version, timeout=timeout,
+            generation=generation)
     return decorator
 
 
+def prefetch_cached(instances, *names, **kwargs):
+    """Resolves the cached properties `names` for each of `instances` in
+    bulk. The cache keys are fetched with `get_many` in batches of
+    `batch_size` instances and the misses are computed and written back
+    with `set_many`. The data (and generations) are stored on the instances
+    so subsequent property access does not hit the cache.
+    """
+    batch_size = kwargs.get('batch_size', PREFETCH_BATCH_SIZE)
+    instances = list(instances)
+
+    if not instances:
+        return instances
+
+    props = []
+    model = instances[0].__class__
+    for name in names:
+        prop = getattr(model, name, None)
+        if not isinstance(prop, CachedProperty):
+            raise AttributeError('{0} is not a cached property on '
+                '{1}'.format(name, model.__name__))
+        props.append(prop)
+
+    for i in xrange(0, len(instances), batch_size):
+        batch = instances[i:i + batch_size]
+
+        # Resolve the generations for the batch in a single round trip
+        labels = {}
+        for instance in batch:
+            for prop in props:
+                if prop.generation:
+                    labels.setdefault(prop.get_generation_label(instance),
+                        []).append(instance)
+
+        for label, generation in get_generations(labels.keys()).iteritems():
+            key = generation_cache_key(label)
+            for instance in labels[label]:
+                instance.__dict__.setdefault(PREFETCHED_ATTR, {})[key] = generation
+
+        keys = {}
+
+        for instance in batch:
+            for prop in props:
+                key = prop.get_key(instance)
+                # Data that cannot be cached is computed on access
+                if key is not None:
+                    keys[key] = (instance, prop)
+
+        found = get_many_cached(keys.keys())
+        missing = {}
+        latest = {}
+
+        for key, (instance, prop) in keys.iteritems():
+            if key in found:
+                data = found[key]
+            else:
+                data = prop.func(instance)
+                # Don't bother caching if the data is None
+                if data is not None:
+                    missing.setdefault(prop.timeout, {})[key] = data
+                    latest[prop.get_latest_key(instance)] = key
+            instance.__dict__.setdefault(PREFETCHED_ATTR, {})[key] = data
+
+        for timeout, data in missing.iteritems():
+            set_many_cached(data, timeout=timeout)
+
+        # References to the latest versions for the stampede protection
+        if latest and settings.CACHE_STAMPEDE_POLICY:
+            cache.set_many(latest, timeout=NEVER_EXPIRE)
+
+    return instances
+
+
 def post_save_cache(sender, instance, **kwargs):
     """General post-save handler for caching model instances. NOTE: This must
     be used in conjunction with the `pre_delete_uncache` since the cache is set
     to never expire.
     """
+    # Prefetched and memoized data is not cached with the instance itself
+    if any(x in instance.__dict__ for x in TRANSIENT_ATTRS):
+        instance = copy.copy(instance)
+        for attr in TRANSIENT_ATTRS:
+            instance.__dict__.pop(attr, None)
     cache.set(instance_cache_key(instance), instance, timeout=NEVER_EXPIRE)
 
 
@@ -64,17 +345,106 @@ def pre_delete_uncache(sender, instance, **kwargs):
 
 # `pk` is used as an alias, so this is constant
 PK_LOOKUPS = ['pk', 'pk__exact']
+PK_IN_LOOKUPS = ['pk__in']
 
 
 class CacheQuerySet(QuerySet):
+    # Names of the cached properties resolved in bulk as the instances
+    # are fetched. See `prefetch_cached`.
+    _prefetch_cached_names = ()
+
+    # Primary keys of a `pk__in` lookup that are resolved from the cache
+    # when the instances are iterated over. This is not cloned since any
+    # further filtering must be done by the database.
+    _cached_pks = None
+
+    def _clone(self, *args, **kwargs):
+        clone = super(CacheQuerySet, self)._clone(*args, **kwargs)
+        clone._prefetch_cached_names = self._prefetch_cached_names
+        return clone
+
+    def _cache_key(self, pk):
+        opts = self.model._meta
+        return INSTANCE_CACHE_KEY.format(opts.app_label, opts.module_name, pk)
+
+    def _get_many(self, pks):
+        """Returns the instances for `pks` in the order of `pks`. The
+        instances are fetched from the cache in a single round trip and
+        only the misses are fetched from the database. The fetched
+        instances are cached for subsequent lookups.
+        """
+        keys = []
+        for pk in pks:
+            key = self._cache_key(pk)
+            if key not in keys:
+                keys.append(key)
+
+        objs = cache.get_many(keys)
+        missing = [pk for pk in pks if self._cache_key(pk) not in objs]
+
+        if missing:
+            fetched = {}
+            for obj in super(CacheQuerySet, self).filter(pk__in=missing):
+                fetched[self._cache_key(obj.pk)] = obj
+            if fetched:
+                cache.set_many(fetched, timeout=NEVER_EXPIRE)
+            objs.update(fetched)
+
+        return [objs[key] for key in keys if key in objs]
+
+    def iterator(self):
+        names = self._prefetch_cached_names
+
+        if self._cached_pks is not None:
+            objs = self._get_many(self._cached_pks)
+            if names:
+                prefetch_cached(objs, *names)
+            for obj in objs:
+                yield obj
+            return
+
+        if not names:
+            for obj in super(CacheQuerySet, self).iterator():
+                yield obj
+            return
+
+        batch = []
+        for obj in super(CacheQuerySet, self).iterator():
+            batch.append(obj)
+            if len(batch) == PREFETCH_BATCH_SIZE:
+                for obj in prefetch_cached(batch, *names):
+                    yield obj
+                batch = []
+        for obj in prefetch_cached(batch, *names):
+            yield obj
+
+    def prefetch_cached(self, *names):
+        """Returns a new QuerySet where the cached properties `names` are
+        resolved in bulk for the instances as they are fetched. Passing
+        `None` clears the list.
+        """
+        clone = self._clone()
+        if names == (None,):
+            clone._prefetch_cached_names = ()
+        else:
+            clone._prefetch_cached_names = self._prefetch_cached_names + names
+        return clone
+
     def filter(self, *args, **kwargs):
         """For primary-key-based lookups, instances may be cached to prevent
         excessive database hits. If this is a primary-key lookup, the cache
         will be checked and populate the `_result_cache` if available.
+
+        For `pk__in` lookups on an otherwise unfiltered QuerySet, the
+        instances are fetched from the cache in one round trip when they are
+        iterated over and only the misses are fetched from the database. The
+        results are in the order of the primary keys that were passed. Other
+        operations such as `count` and further filtering are performed by
+        the database as usual.
         """
         clone = super(CacheQuerySet, self).filter(*args, **kwargs)
 
-        pk = None
+        pk = pks = None
         opts = self.model._meta
         pk_name = opts.pk.name
 
@@ -84,11 +454,24 @@ class CacheQuerySet(QuerySet):
                 pk = kwargs[key]
                 break
 
+        for key in PK_IN_LOOKUPS + ['{0}__in'.format(pk_name)]:
+            if key in kwargs:
+                pks = kwargs[key]
+                break
+
         if pk is not None:
-            key = INSTANCE_CACHE_KEY.format(opts.app_label, opts.module_name, pk)
-            obj = cache.get(key)
+            obj = cache.get(self._cache_key(pk))
             if obj is not None:
                 clone._result_cache = [obj]
+        # Only a list of primary keys can be resolved, not a subquery. Any
+        # other conditions would need to be applied to the cached instances
+        # so the lookup must be the only one.
+        elif isinstance(pks, (list, tuple, set)) and not args \
+                and len(kwargs) == 1 and not self.query.where:
+            clone._cached_pks = list(pks)
+
+        if clone._result_cache is not None and clone._prefetch_cached_names:
+            prefetch_cached(clone._result_cache, *clone._prefetch_cached_names)
 
         return clone
 
@@ -0,0 +1,188 @@
+import os
+import heapq
+import cPickle as pickle
+from array import array
+from bisect import bisect_left
+from django.utils.encoding import smart_unicode
+from avocado.conf import settings
+from avocado.core.cache import get_generation
+
+INDEX_FILENAME = '{0}-{1}.index'
+
+# Loaded indexes keyed by the natural key of the datafield
+_indexes = {}
+
+
+# Substrings up to this length are indexed
+GRAM_SIZE = 3
+
+
+def grams(value, size=GRAM_SIZE):
+    "Returns the set of substrings of `value` of length `size`."
+    return set(value[i:i + size] for i in xrange(len(value) - size + 1))
+
+
+def all_grams(value):
+    "Returns the set of substrings of `value` up to `GRAM_SIZE` in length."
+    found = set()
+    for size in xrange(1, GRAM_SIZE + 1):
+        found.update(grams(value, size))
+    return found
+
+
+class ValueIndex(object):
+    """Index of distinct string values for answering prefix and substring
+    queries without scanning the table. The values are kept sorted by their
+    lowercased form so prefix matches are a contiguous range and substring
+    candidates are found using an inverted index of the substrings up to three
+    characters in length. Queries of one or two characters are answered by
+    the index directly.
+    """
+    def __init__(self, values):
+        values = sorted(set(smart_unicode(x) for x in values if x),
+            key=lambda x: x.lower())
+
+        self.values = values
+        self.lower = [x.lower() for x in values]
+        self.grams = {}
+
+        for i, value in enumerate(self.lower):
+            for gram in all_grams(value):
+                if gram not in self.grams:
+                    self.grams[gram] = array('I')
+                self.grams[gram].append(i)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _prefix_range(self, query):
+        start = bisect_left(self.lower, query)
+        end = bisect_left(self.lower, query + u'\uffff', start)
+        return start, end
+
+    def _candidates(self, query):
+        "Returns the indices of values that may contain `query`."
+        # Short queries are indexed themselves
+        if len(query) <= GRAM_SIZE:
+            return self.grams.get(query, ())
+
+        postings = []
+        for gram in grams(query):
+            if gram not in self.grams:
+                return ()
+            postings.append(self.grams[gram])
+
+        # Intersect starting from the smallest set of postings
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for indices in postings[1:]:
+            candidates.intersection_update(indices)
+        return candidates
+
+    def search(self, query, limit=None):
+        """Returns the values containing `query` (case-insensitive). Values
+        starting with `query` are ranked first, followed by the values
+        containing it ordered by the position of the match. Ties are ordered
+        by length and then alphabetically.
+        """
+        query = smart_unicode(query).lower()
+
+        start, end = self._prefix_range(query)
+        prefix = [(len(self.lower[i]), i) for i in xrange(start, end)]
+
+        if limit and len(prefix) >= limit:
+            return [self.values[i] for _, i in heapq.nsmallest(limit, prefix)]
+
+        prefix.sort()
+        results = [self.values[i] for _, i in prefix]
+
+        ranked = []
+        for i in self._candidates(query):
+            if start <= i < end:
+                continue
+            position = self.lower[i].find(query)
+            if position > 0:
+                ranked.append((position, len(self.lower[i]), i))
+
+        if limit:
+            ranked = heapq.nsmallest(limit - len(results), ranked)
+        else:
+            ranked.sort()
+
+        results.extend(self.values[i] for _, _, i in ranked)
+        return results
+
+
+def index_version(datafield):
+    """Returns the version of the index for `datafield` derived from the
+    `data_modified` and the cache generation of the model.
+    """
+    if datafield.data_modified is None:
+        modified = '0'
+    else:
+        modified = datafield.data_modified.strftime('%Y%m%d%H%M%S%f')
+    return '{0}-{1}'.format(modified, get_generation(datafield.model_label))
+
+
+def index_path(datafield):
+    """Returns the path of the index file for the current version of the
+    `datafield` or `None` if the `VALUE_INDEX_DIR` setting is not defined.
+    """
+    if not settings.VALUE_INDEX_DIR:
+        return
+    name = INDEX_FILENAME.format('.'.join(datafield.natural_key()),
+        index_version(datafield))
+    return os.path.join(settings.VALUE_INDEX_DIR, name)
+
+
+def get_index(datafield):
+    """Returns the `ValueIndex` for the current version of `datafield` or
+    `None` if one has not been built.
+    """
+    path = index_path(datafield)
+    if path is None:
+        return
+
+    key = datafield.natural_key()
+    loaded = _indexes.get(key)
+    if loaded and loaded[0] == path:
+        return loaded[1]
+
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb') as f:
+        index = pickle.load(f)
+    _indexes[key] = (path, index)
+    return index
+
+
+def build_index(datafield):
+    """Builds and writes the `ValueIndex` for the current version of
+    `datafield`. Index files of previous versions are removed.
+    """
+    path = index_path(datafield)
+    if path is None:
+        raise ValueError('The VALUE_INDEX_DIR setting must be defined')
+
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+
+    index = ValueIndex(datafield.iter_values())
+
+    # Written to a temporary file first so readers never load a partially
+    # written index
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp_path, path)
+
+    prefix = '{0}-'.format('.'.join(datafield.natural_key()))
+    for name in os.listdir(dirname):
+        if name.startswith(prefix) and name.endswith('.index') \
+                and os.path.join(dirname, name) != path:
+            os.remove(os.path.join(dirname, name))
+
+    _indexes[datafield.natural_key()] = (path, index)
+    return index
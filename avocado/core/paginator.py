@@ -1,7 +1,45 @@
 import math
+from django.db.models import Model, Q
 from django.core.paginator import Paginator, Page
 
 
+class PageLinksMixin(object):
+    "Mixin for page classes providing the links to neighboring pages."
+    def page_links(self, before_after_count=2, first_last_count=0):
+        pages = []
+        # only process if the current page number is greater than the number of
+        # required links.
+        if self.number > (first_last_count + before_after_count + 1):
+            # append first pages, e.g. [1, 2] if `first_last_count' is 2
+            for i in range(1, first_last_count + 1):
+                pages.append(i)
+
+            pages.append(None)
+            # append the leading pages relative to the current page, e.g.
+            # [10, 11] if `before_after_count' is 2 and current page is 12
+            for i in range(self.number - before_after_count, self.number):
+                pages.append(i)
+
+        else:
+            for i in range(1, self.number):
+                pages.append(i)
+
+        # if there is still a gap until `self.paginator.num_pages' is reached, add trailing pages
+        if (self.number + first_last_count + before_after_count) < self.paginator.num_pages:
+            for i in range(self.number, self.number + before_after_count + 1):
+                pages.append(i)
+
+            pages.append(None)
+            for i in range(self.paginator.num_pages + 1 - first_last_count, self.paginator.num_pages + 1):
+                pages.append(i)
+
+        else:
+            for i in range(self.number, self.paginator.num_pages + 1):
+                pages.append(i)
+
+        return pages
+
+
 class BufferedPaginator(Paginator):
     """A subclass of the Django Paginator class that allows for explicitly
     setting the `_count` attribute i.e. the theoretical size of
@@ -129,7 +167,7 @@ class BufferedPaginator(Paginator):
         return (overlap, (start_offset, start_limit), (end_offset, end_limit))
 
 
-class BufferedPage(Page):
+class BufferedPage(PageLinksMixin, Page):
     """A subclass of the Django `Page` class which adds an additional method to
     determine if this page is in cache. The determination is with respect to
     the `paginator`, `offset` and `buf_size' attributes.
@@ -164,36 +202,296 @@ class BufferedPage(Page):
 
         return None
 
-    def page_links(self, before_after_count=2, first_last_count=0):
-        pages = []
-        # only process if the current page number is greater than the number of
-        # required links.
-        if self.number > (first_last_count + before_after_count + 1):
-            # append first pages, e.g. [1, 2] if `first_last_count' is 2
-            for i in range(1, first_last_count + 1):
-                pages.append(i)
 
-            pages.append(None)
-            # append the leading pages relative to the current page, e.g.
-            # [10, 11] if `before_after_count' is 2 and current page is 12
-            for i in range(self.number - before_after_count, self.number):
-                pages.append(i)
+class BufferManager(object):
+    """Maintains a live buffer of contiguous rows of `object_list` (typically
+    a queryset) as the window of rows being viewed changes. When the window
+    moves, only the rows missing from the buffer are fetched as determined
+    by `BufferedPaginator.get_overlap` and spliced into the buffer.
+
+    `buf_size` is the default number of rows in a window. Rows outside of
+    the window are kept up to `span` rows in total, after which the rows
+    farthest behind the direction of scrolling are evicted. `read_ahead`
+    is the number of additional rows fetched in the direction of scrolling
+    so subsequent small scrolls do not require a query.
+    """
+    def __init__(self, object_list, per_page, buf_size, count=None, span=None,
+            read_ahead=0):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.buf_size = buf_size
+        self.read_ahead = read_ahead
+        self.span = max(span or 0, buf_size + read_ahead)
 
+        self._count = count
+        self.offset = 0
+        self.rows = []
+
+        # Number of rows that have been fetched from `object_list`
+        self.fetched = 0
+
+    @property
+    def count(self):
+        if self._count is None:
+            try:
+                self._count = self.object_list.count()
+            except (AttributeError, TypeError):
+                self._count = len(self.object_list)
+        return self._count
+
+    def paginator(self):
+        "Returns a `BufferedPaginator` for the current buffer."
+        return BufferedPaginator(self.count, object_list=self.rows,
+            offset=self.offset, buf_size=len(self.rows), per_page=self.per_page)
+
+    def _fetch(self, offset, limit):
+        if limit <= 0:
+            return []
+        rows = list(self.object_list[offset:offset + limit])
+        self.fetched += len(rows)
+        return rows
+
+    def _load(self, offset, size):
+        "Ensures the rows from `offset` to `offset + size` are buffered."
+        if size <= 0:
+            return
+
+        if not self.rows:
+            self.rows = self._fetch(offset, size)
+            self.offset = offset
+            return
+
+        overlap, start, end = self.paginator().get_overlap(offset, size)
+
+        if not overlap:
+            self.rows = self._fetch(offset, size)
+            self.offset = offset
+            return
+
+        start_offset, start_limit = start
+        end_offset, end_limit = end
+
+        if start_limit:
+            self.rows = self._fetch(start_offset, start_limit) + self.rows
+            self.offset = start_offset
+
+        # The end offset from `get_overlap` is one past the last buffered
+        # row rather than the first missing row
+        if end_limit:
+            self.rows += self._fetch(end_offset - 1, end_limit)
+
+    def _evict(self, offset, size, forward):
+        excess = len(self.rows) - self.span
+        if excess <= 0:
+            return
+
+        head = max(offset - self.offset, 0)
+        tail = max(len(self.rows) - head - size, 0)
+
+        # Rows behind the direction of scrolling are evicted first
+        if forward:
+            drop_head = min(head, excess)
         else:
-            for i in range(1, self.number):
-                pages.append(i)
+            drop_head = max(excess - tail, 0)
 
-        # if there is still a gap until `self.paginator.num_pages' is reached, add trailing pages
-        if (self.number + first_last_count + before_after_count) < self.paginator.num_pages:
-            for i in range(self.number, self.number + before_after_count + 1):
-                pages.append(i)
+        drop_tail = excess - drop_head
 
-            pages.append(None)
-            for i in range(self.paginator.num_pages + 1 - first_last_count, self.paginator.num_pages + 1):
-                pages.append(i)
+        self.rows = self.rows[drop_head:len(self.rows) - drop_tail]
+        self.offset += drop_head
+
+    def get(self, offset, limit=None):
+        """Returns `limit` rows (defaults to `buf_size`) starting at the
+        zero-based `offset`, fetching the rows that are not buffered.
+        """
+        limit = limit or self.buf_size
+        offset = max(min(offset, self.count), 0)
+
+        start = offset
+        end = min(offset + limit, self.count)
+        forward = offset >= self.offset
+
+        # The read ahead rows are only fetched along with missing rows
+        buffered = self.offset <= start and end <= self.offset + len(self.rows)
+
+        if self.rows and self.read_ahead and not buffered:
+            if forward:
+                end += self.read_ahead
+            else:
+                start = max(start - self.read_ahead, 0)
+
+        end = min(end, self.count)
+
+        self._load(start, end - start)
+        self._evict(start, end - start, forward)
+
+        index = offset - self.offset
+        return self.rows[index:index + limit]
+
+    def page(self, number):
+        "Returns a `BufferedPage` for `number` with its rows from the buffer."
+        number = self.paginator().validate_number(number)
+        object_list = self.get((number - 1) * self.per_page, self.per_page)
+        return BufferedPage(number, self.paginator(), object_list)
+
+
+class KeysetPaginator(Paginator):
+    """A subclass of the Django Paginator class that fetches pages of a
+    queryset using the sort key of a neighboring page rather than an OFFSET.
+    The database must scan and skip every row before an OFFSET, so deep pages
+    get slower linearly. A WHERE clause on the sort key of the last row of the
+    previous page (or the first row of the next page) can use an index
+    instead.
+
+    `ordering` is a sequence of field lookups as passed to `order_by` and
+    defaults to the ordering of the queryset, e.g. as applied by the
+    `DataView`. The primary key is appended as a tiebreaker if it is not
+    already included so each row has a unique key.
+
+    The first and last key of each page that has been fetched are kept in
+    `bounds`. Pages that do not neighbor a fetched page (or neighbor a page
+    having a null key) are fetched using an OFFSET. Since the paginator is
+    typically constructed per request, `bounds` can be stored and passed
+    back in to continue paginating using keys.
+    """
+    def __init__(self, object_list, per_page, *args, **kwargs):
+        # Keyword-only so the positional arguments of `Paginator` are
+        # not shifted
+        ordering = kwargs.pop('ordering', None)
+        count = kwargs.pop('count', None)
+        bounds = kwargs.pop('bounds', None)
+
+        super(KeysetPaginator, self).__init__(object_list, per_page, *args, **kwargs)
+
+        if count is not None:
+            self._count = count
+
+        if ordering is None:
+            ordering = object_list.query.order_by or \
+                object_list.model._meta.ordering
+
+        ordering = list(ordering)
+        pk_name = object_list.model._meta.pk.name
+
+        if not any(x.lstrip('-') in ('pk', pk_name) for x in ordering):
+            ordering.append('pk')
+
+        self.ordering = ordering
+        self.bounds = bounds or {}
+
+    @property
+    def key_fields(self):
+        return [x.lstrip('-') for x in self.ordering]
+
+    def _get_key(self, obj):
+        "Returns the values of the key fields for a fetched object."
+        key = []
+        for name in self.key_fields:
+            value = obj
+            for attr in name.split('__'):
+                value = getattr(value, attr)
+                if value is None:
+                    break
+            # Related objects are compared by primary key
+            if isinstance(value, Model):
+                value = value.pk
+            key.append(value)
+        return tuple(key)
+
+    def _condition(self, key, reverse=False):
+        """Returns a `Q` object matching the rows after `key` relative to the
+        ordering or before `key` if `reverse` is true. For an ordering of
+        (a, b, pk) this corresponds to::
+
+            a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+
+        Returns `None` if `key` contains a null value since the position of
+        nulls in the ordering differs between databases.
+        """
+        if any(x is None for x in key):
+            return None
+
+        condition = equal = None
+
+        for lookup, value in zip(self.ordering, key):
+            descending = lookup.startswith('-')
+            name = lookup.lstrip('-')
+
+            operator = 'lt' if descending != reverse else 'gt'
+            q = Q(**{'{0}__{1}'.format(name, operator): value})
+
+            if equal is not None:
+                q = equal & q
+                equal = equal & Q(**{name: value})
+            else:
+                equal = Q(**{name: value})
+
+            condition = q if condition is None else condition | q
 
+        return condition
+
+    def _fetch(self, condition, reverse, offset, limit):
+        queryset = self.object_list._clone()
+
+        # The condition is added to the query directly since the lookups are
+        # relative to the model of the queryset already
+        if condition is not None:
+            queryset.query.add_q(condition)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [x[1:] if x.startswith('-') else '-' + x for x in ordering]
+
+        queryset = queryset.order_by(*ordering)
+
+        object_list = list(queryset[offset:offset + limit])
+
+        if reverse:
+            object_list.reverse()
+
+        return object_list
+
+    def page(self, number):
+        """Returns a `KeysetPage` object for the given 1-based page number.
+        The page is fetched relative to the bounds of the previous or next
+        page if known, otherwise using an OFFSET.
+        """
+        number = self.validate_number(number)
+
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+
+        if top + self.orphans >= self.count:
+            top = self.count
+
+        limit = max(top - bottom, 0)
+        condition = None
+        reverse = False
+
+        if number > 1 and number - 1 in self.bounds:
+            condition = self._condition(self.bounds[number - 1][1])
+        elif number + 1 in self.bounds:
+            condition = self._condition(self.bounds[number + 1][0], reverse=True)
+            reverse = True
+
+        if condition is not None:
+            offset = 0
         else:
-            for i in range(self.number, self.paginator.num_pages + 1):
-                pages.append(i)
+            offset = bottom
+            reverse = False
 
-        return pages
+        object_list = self._fetch(condition, reverse, offset, limit)
+
+        # The keys are taken from the fetched objects so they are consistent
+        # with the rows on the page
+        if object_list:
+            self.bounds[number] = (self._get_key(object_list[0]),
+                self._get_key(object_list[-1]))
+
+        return KeysetPage(object_list, number, self)
+
+
+class KeysetPage(PageLinksMixin, Page):
+    "A page of a `KeysetPaginator`."
+    def offset(self):
+        "Returns a zero-based offset of this page."
+        return max(self.start_index(), 1) - 1
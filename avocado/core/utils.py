@@ -1,4 +1,8 @@
+import uuid
 from django import forms
+from django.db import connections
+from django.db.models.query import EmptyQuerySet
+from django.db.models.sql.datastructures import EmptyResultSet
 from django.utils.importlib import import_module
 from avocado.conf import settings
 
@@ -37,9 +41,66 @@ def get_heuristic_flags(field):
     enumerable = False
 
     if field.internal_type != 'text' and field.simple_type in ('string', 'boolean') \
-            and field.size <= settings.ENUMERABLE_MAXIMUM:
+            and len(field) <= settings.ENUMERABLE_MAXIMUM:
         enumerable = True
 
     return {
         'enumerable': enumerable,
     }
+
+
+def _server_cursor(connection):
+    "Returns a cursor that does not load all rows of the result into memory."
+    # Ensure the underlying connection has been opened
+    cursor = connection.cursor()
+
+    if connection.vendor == 'postgresql':
+        cursor.close()
+        # Named cursors are server-side cursors in psycopg2
+        cursor = connection.connection.cursor(
+            name='avocado_{0}'.format(uuid.uuid4().hex))
+    elif connection.vendor == 'mysql':
+        from MySQLdb.cursors import SSCursor
+        cursor.close()
+        cursor = connection.connection.cursor(SSCursor)
+
+    return cursor
+
+
+def iter_queryset(queryset, chunk_size=None):
+    """Returns an iterator over the rows of `queryset` which are fetched
+    `chunk_size` rows at a time (defaults to the `CURSOR_CHUNK_SIZE`
+    setting) using a server-side cursor if supported by the database. Unlike
+    iterating over the queryset, this does not load the whole result into
+    memory on the client. Rows are tuples as returned by `values_list`.
+    """
+    if isinstance(queryset, EmptyQuerySet):
+        return
+
+    chunk_size = chunk_size or settings.CURSOR_CHUNK_SIZE
+    compiler = queryset.query.get_compiler(queryset.db)
+
+    try:
+        sql, params = compiler.as_sql()
+    except EmptyResultSet:
+        return
+
+    # Some backends convert the raw column values, e.g. booleans in MySQL
+    resolve_columns = hasattr(compiler, 'resolve_columns')
+    fields = queryset.query.select_fields + queryset.query.related_select_fields
+
+    cursor = _server_cursor(connections[queryset.db])
+
+    try:
+        cursor.execute(sql, params)
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                if resolve_columns:
+                    row = compiler.resolve_columns(row, fields)
+                yield tuple(row)
+    finally:
+        cursor.close()
@@ -1,4 +1,41 @@
+from itertools import islice
+from collections import deque
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+from multiprocessing import Pool
 from cStringIO import StringIO
+from tempfile import SpooledTemporaryFile
+from django.db import connections
+from django.http import HttpResponse
+from avocado.conf import settings
+from avocado.core.cache import close_cache
+
+# The exporter whose rows are formatted by the worker process
+_worker_exporter = None
+
+# Database connections inherited from the parent process
+_inherited_connections = []
+
+
+def _init_worker(exporter):
+    global _worker_exporter
+    _worker_exporter = exporter
+
+    # The inherited connections are shared with the parent process, so they
+    # are detached rather than closed (which would close them for the parent
+    # as well). New connections are opened on demand.
+    for connection in connections.all():
+        _inherited_connections.append(connection.connection)
+        connection.connection = None
+
+    # Likewise the cache client must not share its connections
+    close_cache()
+
+
+def _format_chunk(rows):
+    return _worker_exporter._format_rows(rows)
 
 
 class BaseExporter(object):
@@ -12,10 +49,12 @@ class BaseExporter(object):
         self.params = []
         self.row_length = 0
 
+        # The offsets of the values for each concept are computed up front
+        # so each row does not need to be sliced successively
         for concept in concepts:
-            length = concept.concept_fields.count()
-            self.row_length += length
-            self.params.append((concept.format, length))
+            start = self.row_length
+            self.row_length += concept.concept_fields.count()
+            self.params.append((concept.format, start, self.row_length))
 
     def get_file_obj(self, name=None):
         if name is None:
@@ -24,25 +63,175 @@ class BaseExporter(object):
             return open(name, 'w+')
         return name
 
-    def _format_row(self, row):
-        for formatter, length in self.params:
-            values, row = row[:length], row[length:]
-            yield formatter(values, self.preferred_formats)
+    def get_spooled_file_obj(self):
+        """Returns a temporary file object that is held in memory until it
+        exceeds the `EXPORT_BUFFER_SIZE` and is then written to disk.
+        """
+        return SpooledTemporaryFile(settings.EXPORT_BUFFER_SIZE)
 
-    def read(self, iterable, force_distinct=True, *args, **kwargs):
-        """Takes an iterable that produces rows to be formatted.
+    def _flush(self, buff, force=False):
+        """Returns and clears the contents of `buff` once it holds at least
+        `EXPORT_BUFFER_SIZE` bytes. If `force` is true, any contents are
+        returned.
+        """
+        size = buff.tell()
+        if size and (force or size >= settings.EXPORT_BUFFER_SIZE):
+            chunk = buff.getvalue()
+            buff.seek(0)
+            buff.truncate()
+            return chunk
 
-        If `force_distinct` is true, rows will be filtered based on the slice
-        of the row that is *up* for to be formatted. Note, this assumes the
-        rows are ordered.
+    def _iter_file(self, f):
+        "Yields the contents of the file object `f` in chunks and closes it."
+        f.seek(0)
+        try:
+            while True:
+                chunk = f.read(settings.EXPORT_BUFFER_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    def _format_rows(self, rows):
+        """Formats a block of `rows` column-wise with each concept's
+        `format_batch` rather than one value at a time. Returns the formatted
+        rows, each a list of the formatted values for each concept.
         """
+        preferred_formats = self.preferred_formats
+        formatted = []
+
+        for concept, (formatter, start, stop) in zip(self.concepts,
+                self.params):
+            columns = concept.format_batch([row[start:stop] for row in rows],
+                preferred_formats)
+            keys = columns.keys()
+            if keys:
+                formatted.append([OrderedDict(zip(keys, values))
+                    for values in zip(*columns.values())])
+            else:
+                formatted.append([OrderedDict() for row in rows])
+
+        return [list(x) for x in zip(*formatted)]
+
+    def _read_serial(self, rows, chunk_size):
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            for row in self._format_rows(chunk):
+                yield row
+
+    def _distinct(self, iterable):
+        row_length = self.row_length
         last_row = None
+
         for row in iterable:
-            _row = row[:self.row_length]
-            if force_distinct and _row == last_row:
+            # Rows that only contain the values to be formatted are
+            # compared as is rather than copied
+            if isinstance(row, tuple) and len(row) == row_length:
+                _row = row
+            else:
+                _row = row[:row_length]
+            if _row == last_row:
                 continue
             last_row = _row
-            yield self._format_row(_row)
+            yield row
+
+    def _read_parallel(self, rows, workers, chunk_size):
+        # The formatters are initialized prior to forking so the workers
+        # do not each need to initialize them
+        for concept in self.concepts:
+            concept._get_formatter()
+
+        # The cache client is closed so the workers do not inherit open
+        # connections. It reconnects on the next access.
+        close_cache()
+
+        pool = Pool(workers, initializer=_init_worker, initargs=(self,))
+
+        # Chunks are formatted in the order they are read. The number of
+        # chunks in flight is bounded, so reading rows is blocked until the
+        # oldest chunk has been formatted and consumed.
+        pending = deque()
+
+        try:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                if len(pending) >= workers * 2:
+                    for row in pending.popleft().get():
+                        yield row
+                pending.append(pool.apply_async(_format_chunk, (chunk,)))
+
+            while pending:
+                for row in pending.popleft().get():
+                    yield row
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def read(self, iterable, force_distinct=True, workers=None,
+            chunk_size=None, *args, **kwargs):
+        """Takes an iterable that produces rows to be formatted.
+
+        If `force_distinct` is true, rows will be filtered based on the slice
+        of the row that is *up* for to be formatted. Note, this assumes the
+        rows are ordered.
+
+        The rows are read and formatted column-wise in chunks of
+        `chunk_size`. If `workers` is greater than one, the chunks are
+        formatted by a pool of processes. The formatted rows are produced in
+        the same order as they are read. The defaults are the
+        `EXPORT_WORKERS` and `EXPORT_CHUNK_SIZE` settings.
+        """
+        if workers is None:
+            workers = settings.EXPORT_WORKERS
+
+        if force_distinct:
+            iterable = self._distinct(iterable)
+
+        chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+        if workers and workers > 1:
+            return self._read_parallel(iter(iterable), workers, chunk_size)
+        return self._read_serial(iter(iterable), chunk_size)
+
+    def iter_write(self, iterable, *args, **kwargs):
+        """Returns an iterator of the export as chunks of bytes, e.g. for the
+        content of a streaming `HttpResponse`::
+
+            HttpResponse(exporter.iter_write(rows),
+                content_type=exporter.content_type)
+
+        Exporters that can produce their output incrementally implement this.
+        For exporters that only implement `write`, the export is written to a
+        spooled temporary file first so it is not held in memory all at once.
+        """
+        # The default `write` consumes this method
+        if self.__class__.write.im_func is BaseExporter.write.im_func:
+            raise NotImplementedError('Exporters must implement iter_write '
+                'or write')
+
+        buff = self.get_spooled_file_obj()
+        try:
+            self.write(iterable, buff=buff, *args, **kwargs)
+        except Exception:
+            buff.close()
+            raise
+        return self._iter_file(buff)
+
+    def write(self, iterable, buff=None, *args, **kwargs):
+        """Writes the chunks produced by `iter_write` to `buff`. Returns the
+        file object written to. If `buff` is an `HttpResponse`, the chunks
+        are streamed as its content instead.
+        """
+        if isinstance(buff, HttpResponse):
+            buff.content = self.iter_write(iterable, *args, **kwargs)
+            return buff
 
-    def write(self, iterable, *args, **kwargs):
-        raise NotImplemented
+        buff = self.get_file_obj(buff)
+        for chunk in self.iter_write(iterable, *args, **kwargs):
+            buff.write(chunk)
+        return buff
@@ -1,4 +1,5 @@
 import csv
+from cStringIO import StringIO
 from _base import BaseExporter
 
 
@@ -11,9 +12,9 @@ class CSVExporter(BaseExporter):
 
     preferred_formats = ('csv', 'number', 'string')
 
-    def write(self, iterable, buff=None, *args, **kwargs):
+    def iter_write(self, iterable, *args, **kwargs):
         header = []
-        buff = self.get_file_obj(buff)
+        buff = StringIO()
         writer = csv.writer(buff, quoting=csv.QUOTE_MINIMAL)
 
         for i, row_gen in enumerate(self.read(iterable, *args, **kwargs)):
@@ -25,4 +26,11 @@ class CSVExporter(BaseExporter):
             if i == 0:
                 writer.writerow(header)
             writer.writerow(row)
-        return buff
+
+            chunk = self._flush(buff)
+            if chunk:
+                yield chunk
+
+        chunk = self._flush(buff, force=True)
+        if chunk:
+            yield chunk
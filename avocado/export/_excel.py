@@ -58,11 +58,12 @@ class ExcelExporter(BaseExporter):
         # not behaving correctly. This function should handle the work
         # https://bitbucket.org/ericgazoni/openpyxl/src/94b05cf9defb9787b4dfbf9e8dca7ba6e0b33d56/openpyxl/writer/excel.py?at=default#cl-154
         # however, no data is actually being saved to the worksheets..
+        # The workbook is saved to a spooled file which is streamed as the
+        # content of the response rather than copied into memory.
         if isinstance(buff, HttpResponse):
-            _buff = self.get_file_obj()
+            _buff = self.get_spooled_file_obj()
             wb.save(_buff)
-            buff.content = _buff.getvalue()
-            _buff.close()
+            buff.content = self._iter_file(_buff)
         else:
             wb.save(buff)
         return buff
@@ -1,4 +1,5 @@
 import inspect
+from cStringIO import StringIO
 from django.core.serializers.json import DjangoJSONEncoder
 from _base import BaseExporter
 
@@ -20,10 +21,16 @@ class JSONExporter(BaseExporter):
 
     preferred_formats = ('json', 'number', 'string')
 
-    def write(self, iterable, buff=None, *args, **kwargs):
-        buff = self.get_file_obj(buff)
+    def iter_write(self, iterable, *args, **kwargs):
+        buff = StringIO()
 
         encoder = JSONGeneratorEncoder()
         for chunk in encoder.iterencode(self.read(iterable, *args, **kwargs)):
             buff.write(chunk)
-        return buff
+            chunk = self._flush(buff)
+            if chunk:
+                yield chunk
+
+        chunk = self._flush(buff, force=True)
+        if chunk:
+            yield chunk
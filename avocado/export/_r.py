@@ -1,10 +1,11 @@
 from zipfile import ZipFile
-from cStringIO import StringIO
 from string import punctuation
+from django.http import HttpResponse
 from django.template import Context
 from django.template.loader import get_template
 from _base import BaseExporter
 from _csv import CSVExporter
+from _zip import get_compression, write_file
 
 
 class RExporter(BaseExporter):
@@ -52,7 +53,14 @@ class RExporter(BaseExporter):
         return factor, level
 
     def write(self, iterable, buff=None, template_name='export/script.R', *args, **kwargs):
-        zip_file = ZipFile(self.get_file_obj(buff), 'w')
+        # The archive is written to a spooled file and streamed as the
+        # content of the response since writing a zip file requires seeking
+        if isinstance(buff, HttpResponse):
+            return super(RExporter, self).write(iterable, buff,
+                template_name=template_name, *args, **kwargs)
+
+        zip_file = ZipFile(self.get_file_obj(buff), 'w',
+            compression=get_compression(), allowZip64=True)
 
         factors = []      # field names
         levels = []       # value dictionaries
@@ -73,15 +81,20 @@ class RExporter(BaseExporter):
         data_filename = 'data.csv'
         script_filename = 'script.R'
 
-        # File buffers
-        data_buff = StringIO()
+        # The data file is spooled to disk as the rows are formatted rather
+        # than held in memory and then streamed into the archive
+        data_buff = self.get_spooled_file_obj()
         # Create the data file
         data_exporter = CSVExporter(self.concepts)
         # Overwrite preferred formats for data file
         data_exporter.preferred_formats = self.preferred_formats
-        data_exporter.write(iterable, data_buff, *args, **kwargs)
 
-        zip_file.writestr(data_filename, data_buff.getvalue())
+        try:
+            for chunk in data_exporter.iter_write(iterable, *args, **kwargs):
+                data_buff.write(chunk)
+            write_file(zip_file, data_filename, data_buff)
+        finally:
+            data_buff.close()
 
         template = get_template(template_name)
         context = Context({
@@ -0,0 +1,88 @@
+import time
+import zlib
+from zipfile import ZipInfo, ZIP_STORED, ZIP_DEFLATED, ZIP64_LIMIT
+from avocado.conf import settings
+
+
+def get_compression(level=None):
+    "Returns the zip compression type for the compression `level`."
+    if level is None:
+        level = settings.EXPORT_COMPRESS_LEVEL
+    return ZIP_DEFLATED if level else ZIP_STORED
+
+
+def write_file(zip_file, arcname, f, level=None):
+    """Writes the contents of the file object `f` to `zip_file` as `arcname`.
+    The contents are read and compressed in chunks, so unlike
+    `ZipFile.writestr` the data does not need to be held in memory. This
+    mirrors `ZipFile.write` which only supports file paths and the default
+    compression level.
+
+    If `level` is not supplied, the `EXPORT_COMPRESS_LEVEL` setting is used.
+    A level of 0 stores the data uncompressed.
+    """
+    if level is None:
+        level = settings.EXPORT_COMPRESS_LEVEL
+
+    # This relies on the private attributes and methods of the Python 2.7
+    # ZipFile: `fp`, `_writecheck`, `_didModify`, `_allowZip64` and the
+    # `zip64` argument of `ZipInfo.FileHeader`. It must be kept in sync
+    # with `ZipFile.write` if the zipfile module changes.
+    f.seek(0, 2)
+    file_size = f.tell()
+    f.seek(0)
+
+    zinfo = ZipInfo(arcname, time.localtime(time.time())[:6])
+    zinfo.external_attr = 0600 << 16L
+    zinfo.compress_type = get_compression(level)
+    zinfo.file_size = file_size
+    zinfo.flag_bits = 0x00
+    zinfo.header_offset = zip_file.fp.tell()
+    zinfo.CRC = 0
+    zinfo.compress_size = 0
+
+    zip_file._writecheck(zinfo)
+    zip_file._didModify = True
+
+    # Compressed size can be larger than uncompressed size
+    zip64 = zip_file._allowZip64 and file_size * 1.05 > ZIP64_LIMIT
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+
+    if level:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    else:
+        compressor = None
+
+    crc = 0
+    compress_size = 0
+
+    while True:
+        data = f.read(settings.EXPORT_BUFFER_SIZE)
+        if not data:
+            break
+        crc = zlib.crc32(data, crc) & 0xffffffff
+        if compressor:
+            data = compressor.compress(data)
+        compress_size += len(data)
+        zip_file.fp.write(data)
+
+    if compressor:
+        data = compressor.flush()
+        compress_size += len(data)
+        zip_file.fp.write(data)
+
+    zinfo.CRC = crc
+    zinfo.compress_size = compress_size
+
+    if not zip64 and zip_file._allowZip64 and compress_size > ZIP64_LIMIT:
+        raise RuntimeError('Compressed size larger than uncompressed size')
+
+    # Seek backwards and write the file header which now includes the CRC
+    # and compressed size
+    position = zip_file.fp.tell()
+    zip_file.fp.seek(zinfo.header_offset, 0)
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    zip_file.fp.seek(position, 0)
+
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
@@ -7,9 +7,21 @@ except ImportError:
     from ordereddict import OrderedDict
 from django.utils.encoding import force_unicode
 from avocado.core import loader
+from avocado.conf import OPTIONAL_DEPS
+
+if OPTIONAL_DEPS['numpy']:
+    import numpy
+else:
+    numpy = None
 
 log = logging.getLogger(__name__)
 
+# Types that are returned as is by `Formatter.to_number`
+NUMBER_TYPES = (int, long, float)
+
+# Marks values that could not be formatted by a column-wise format method
+_missing = object()
+
 
 class FormatterException(Exception):
     pass
@@ -105,84 +117,268 @@ class Formatter(object):
         # logging the exception twice
         self._errors = {}
 
-    def __call__(self, values, preferred_formats=None, **context):
-        # Create a copy of the preferred formats since each set values may
-        # be processed slightly differently (e.g. mixed data type in column)
-        # which could cause exceptions that would not be present during
-        # processing of other values
+        # Dispatch plans keyed by the preferred formats
+        self._plans = {}
+
+    def __getstate__(self):
+        # Plans contain bound methods which cannot be pickled
+        state = self.__dict__.copy()
+        state['_plans'] = {}
+        return state
+
+    def _get_plan(self, preferred_formats):
+        """Returns the dispatch plan for `preferred_formats`. The format
+        methods are resolved once and split into the methods that process all
+        values and the chain of methods for processing each value.
+        """
         if preferred_formats is None:
             preferred_formats = self.default_formats
-        preferred_formats = list(preferred_formats) + ['raw']
-
-        # Create a OrderedDict of the values relative to the
-        # concept fields objects the values represent. This
-        # enables key-based access to the values rather than
-        # relying on position.
-        if not isinstance(values, OrderedDict):
-            # Wrap single values
-            if not isinstance(values, (list, tuple)):
-                values = [values]
-            values = OrderedDict(zip(self.keys, values))
+        else:
+            preferred_formats = tuple(preferred_formats)
+
+        plan = self._plans.get(preferred_formats)
+
+        if plan is None:
+            multiple = []
+            chain = []
+
+            for f in preferred_formats + ('raw',):
+                method = getattr(self, 'to_{0}'.format(f), None)
+                # This formatter does not support this format
+                if not method:
+                    continue
+                if getattr(method, 'process_multiple', False):
+                    multiple.append(method)
+                else:
+                    chain.append(method)
+
+            plan = self._plans[preferred_formats] = {
+                'multiple': multiple,
+                'chain': chain,
+            }
+        return plan
+
+    def _format_value(self, plan, value, field, context):
+        """Processes `value` with the methods in the chain in order, returning
+        the position of the method that succeeded and its output.
+        """
+        for i, method in enumerate(plan['chain']):
+            try:
+                return i, method(value, field=field, concept=self.concept,
+                    process_multiple=False, **context)
+            except Exception:
+                if field and field not in self._errors:
+                    self._errors[field] = None
+                    log.warning('Single-value formatter error', exc_info=True)
+        return None, None
 
-        # Iterate over all preferred formats and attempt to process the values.
-        # For formatter methods that process all values must be tracked and
-        # attempted only once. They are removed from the list once attempted.
-        # If no preferred multi-value methods succeed, each value is processed
-        # independently with the remaining formats
-        for f in iter(preferred_formats):
-            method = getattr(self, 'to_{0}'.format(f), None)
-            # This formatter does not support this format, remove it
-            # from the available list
-            if not method:
-                preferred_formats.pop(0)
-                continue
+    def __call__(self, values, preferred_formats=None, **context):
+        plan = self._get_plan(preferred_formats)
+
+        # Wrap single values
+        if not isinstance(values, (OrderedDict, list, tuple)):
+            values = [values]
 
-            # The implicit behavior when handling multiple values is to process
-            # them independently since, in most cases, they are not dependent
-            # on one another, but rather should be represented together since
-            # the data is related. A formatter method can be flagged to process
-            # all values together by setting the attribute
-            # `process_multiple=True`. we must # check to if that flag has been
-            # set and simply pass through the values and context to the method
-            # as is. if ``process_multiple`` is not set, each value is handled
-            # independently
-            if getattr(method, 'process_multiple', False):
+        # Iterate over all preferred formats and attempt to process the values.
+        # The implicit behavior when handling multiple values is to process
+        # them independently since, in most cases, they are not dependent
+        # on one another, but rather should be represented together since
+        # the data is related. A formatter method can be flagged to process
+        # all values together by setting the attribute
+        # `process_multiple=True`. If no preferred multi-value methods
+        # succeed, each value is processed independently with the remaining
+        # formats.
+        if plan['multiple']:
+            # Create a OrderedDict of the values relative to the
+            # concept fields objects the values represent. This
+            # enables key-based access to the values rather than
+            # relying on position.
+            if not isinstance(values, OrderedDict):
+                values = OrderedDict(zip(self.keys, values))
+
+            for method in plan['multiple']:
                 try:
                     output = method(values, fields=self.fields,
                         concept=self.concept, process_multiple=True, **context)
                     if not isinstance(output, dict):
                         return OrderedDict([(self.concept.name, output)])
                     return output
-                # Remove from the preferred formats list since it failed
                 except Exception:
                     if self.concept and self.concept not in self._errors:
                         self._errors[self.concept] = None
                         log.warning('Multi-value formatter error', exc_info=True)
-                    preferred_formats.pop(0)
+
+        if isinstance(values, OrderedDict):
+            items = values.iteritems()
+        else:
+            items = zip(self.keys, values)
+
+        fields = self.fields
 
         # The output is independent of the input. Formatters may output more
         # or less values than what was entered.
         output = OrderedDict()
 
-        # Attempt to process each
-        for i, (key, value) in enumerate(values.iteritems()):
-            for f in preferred_formats:
-                method = getattr(self, 'to_{0}'.format(f))
+        # Each value is processed by the first method in the chain that
+        # succeeds for it
+        for key, value in items:
+            field = fields[key] if fields else None
+            i, fvalue = self._format_value(plan, value, field, context)
+            if i is None:
+                continue
+
+            if isinstance(fvalue, dict):
+                output.update(fvalue)
+            else:
+                output[key] = fvalue
+        return output
+
+    def format_batch(self, rows, preferred_formats=None, arrays=False,
+            **context):
+        """Formats a block of `rows` column-wise rather than one row at a
+        time. Each row is a sequence of values corresponding to `keys`.
+
+        Returns an OrderedDict of the formatted columns keyed by the output
+        key. The formatted rows are simply `zip(*columns.values())`.
+
+        Each value is formatted by the first preferred format that succeeds
+        for it, the same as `__call__`. A format method is applied to all
+        values of a column that have not yet been formatted at once, and the
+        built-in format methods are applied to the column as a whole without
+        raising an exception per value.
+
+        Rows are formatted one at a time when a multi-value format method is
+        preferred or a format method outputs more than one value.
+
+        If `arrays` is true and NumPy is installed, the columns of number
+        fields with only numerical values are returned as arrays.
+        """
+        plan = self._get_plan(preferred_formats)
+        rows = list(rows)
+
+        columns = None
+
+        if not plan['multiple']:
+            columns = OrderedDict()
+
+            for i, key in enumerate(self.keys):
                 field = self.fields[key] if self.fields else None
-                try:
-                    fvalue = method(value, field=field, concept=self.concept,
-                        process_multiple=False, **context)
-                    if isinstance(fvalue, dict):
-                        output.update(fvalue)
-                    else:
-                        output[key] = fvalue
+                column = self._format_column(plan, [row[i] for row in rows],
+                    field, context)
+
+                if column is None:
+                    columns = None
                     break
+
+                if arrays and numpy and field and field.simple_type == 'number':
+                    array = numpy.array(column)
+                    if array.dtype.kind in 'iuf':
+                        column = array
+
+                columns[key] = column
+
+        if columns is None:
+            columns = self._rows_to_columns([self(row, preferred_formats,
+                **context) for row in rows])
+        return columns
+
+    def _rows_to_columns(self, rows):
+        columns = OrderedDict()
+        for i, row in enumerate(rows):
+            for key, value in row.iteritems():
+                if key not in columns:
+                    columns[key] = [None] * len(rows)
+                columns[key][i] = value
+        return columns
+
+    def _format_column(self, plan, values, field, context):
+        """Formats a column of `values` with the methods in the chain. Returns
+        `None` if a method outputs more than one value for a value.
+        """
+        output = [None] * len(values)
+        pending = range(len(values))
+
+        for method in plan['chain']:
+            pvalues = [values[i] for i in pending]
+            results = None
+
+            column_method = self._column_methods.get(method.im_func)
+            if column_method is not None:
+                try:
+                    results = column_method(self, pvalues, field=field,
+                        concept=self.concept, **context)
                 except Exception:
-                    if field and field not in self._errors:
-                        self._errors[field] = None
-                        log.warning('Single-value formatter error', exc_info=True)
+                    pass
+
+            # Fallback to processing each value independently
+            if results is None:
+                results = [self._format_single(method, value, field, context)
+                    for value in pvalues]
+
+            remaining = []
+            for i, fvalue in zip(pending, results):
+                if fvalue is _missing:
+                    remaining.append(i)
+                elif isinstance(fvalue, dict):
+                    return
+                else:
+                    output[i] = fvalue
+
+            pending = remaining
+            if not pending:
+                break
+
+        return output
+
+    def _format_single(self, method, value, field, context):
+        try:
+            return method(value, field=field, concept=self.concept,
+                process_multiple=False, **context)
+        except Exception:
+            if field and field not in self._errors:
+                self._errors[field] = None
+                log.warning('Single-value formatter error', exc_info=True)
+        return _missing
+
+    # Column-wise implementations of the built-in format methods. Values that
+    # cannot be formatted are marked as missing.
+
+    def _string_column(self, values, **context):
+        return [u'' if x is None else force_unicode(x, strings_only=False)
+            for x in values]
+
+    def _boolean_column(self, values, **context):
+        return [x if type(x) is bool else _missing for x in values]
+
+    def _number_column(self, values, **context):
+        if all(isinstance(x, NUMBER_TYPES) for x in values):
+            return values
+
+        output = []
+        for x in values:
+            if isinstance(x, NUMBER_TYPES):
+                output.append(x)
+            elif isinstance(x, Decimal):
+                output.append(float(str(x)))
+            elif isinstance(x, basestring):
+                try:
+                    output.append(self.to_number(x, **context))
+                except FormatterException:
+                    output.append(_missing)
+            else:
+                output.append(_missing)
         return output
 
+    def _coded_column(self, values, **context):
+        field = context.get('field')
+        if not field or not field.lexicon:
+            return [_missing] * len(values)
+        codes = field.get_codes(values)
+        return [codes.get(x, _missing) for x in values]
+
+    def _raw_column(self, values, **context):
+        return values
+
     def __contains__(self, choice):
         return hasattr(self, 'to_{0}'.format(choice))
 
@@ -206,7 +402,7 @@ class Formatter(object):
     def to_number(self, value, **context):
         # Attempts to convert a number. Starting with ints and floats
         # Eventually create to_decimal using the decimal library.
-        if isinstance(value, (int, float)):
+        if isinstance(value, NUMBER_TYPES):
             return value
         if isinstance(value, Decimal):
             return float(str(value))
@@ -222,21 +418,37 @@ class Formatter(object):
     def to_coded(self, value, **context):
         # Attempts to convert value to its coded representation
         field = context.get('field')
-        if field:
-            for key, coded in field.coded_values:
-                if key == value:
-                    return coded
+        if field and field.lexicon:
+            try:
+                return field.get_code(value)
+            except KeyError:
+                pass
         raise FormatterException('No coded value for {0}'.format(value))
 
     def to_raw(self, value, **context):
         return value
 
 
+# Built-in format methods mapped to their column-wise implementation. Methods
+# that are overridden in subclasses are not mapped.
+Formatter._column_methods = {
+    Formatter.to_string.im_func: Formatter._string_column.im_func,
+    Formatter.to_boolean.im_func: Formatter._boolean_column.im_func,
+    Formatter.to_number.im_func: Formatter._number_column.im_func,
+    Formatter.to_coded.im_func: Formatter._coded_column.im_func,
+    Formatter.to_raw.im_func: Formatter._raw_column.im_func,
+}
+
+
 class RawFormatter(Formatter):
     def __call__(self, values, *args, **kwargs):
         preferred_formats = ['raw']
         return super(RawFormatter, self).__call__(values, preferred_formats)
 
+    def format_batch(self, rows, *args, **kwargs):
+        return super(RawFormatter, self).format_batch(rows, ['raw'],
+            arrays=kwargs.get('arrays', False))
+
 
 registry = loader.Registry(default=Formatter, register_instance=False)
 loader.autodiscover('formatters')
@@ -12,6 +12,7 @@ class Command(BaseCommand):
         'check': 'check',
         'data': 'data',
         'cache': 'cache',
+        'index': 'index',
         'legacy': 'legacy',
         'lexicon': 'lexicon',
         'history': 'history',
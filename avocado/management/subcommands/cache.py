@@ -1,7 +1,65 @@
 import sys
+import time
+from multiprocessing import Pool
+from optparse import make_option
+from django.db import connections
 from django.db.models import Q
 from django.core.management.base import BaseCommand
 from avocado.models import DataField
+from avocado.core.cache import get_many_cached, prefetch_cached, close_cache
+from avocado.core.cache.model import PREFETCH_BATCH_SIZE
+
+# Cached properties on `DataField` that are updated
+CACHED_PROPERTIES = ('size', 'labels', 'values', 'codes', 'label_index',
+    'code_index')
+
+# Cached properties that only apply to lexicon fields. They are `None`
+# otherwise which is not cached.
+LEXICON_PROPERTIES = ('codes', 'code_index')
+
+
+def cache_field(pk):
+    """Updates the cached properties for the `DataField` with `pk`. Returns
+    the primary key and the number of seconds it took.
+    """
+    datafield = DataField.objects.get(pk=pk)
+    start = time.time()
+    for name in CACHED_PROPERTIES:
+        getattr(datafield, name)
+    return pk, time.time() - start
+
+
+def estimate_costs(fields):
+    """Returns a dict of the estimated cost of updating each of the `fields`
+    keyed by primary key. The cost is the number of rows of the model the
+    field is associated with since the values are derived from a scan of it.
+    """
+    counts = {}
+    costs = {}
+    for datafield in fields:
+        model = datafield.model
+        if model is None:
+            costs[datafield.pk] = 0
+            continue
+        if model not in counts:
+            counts[model] = model.objects.count()
+        costs[datafield.pk] = counts[model]
+    return costs
+
+
+def is_cached(datafield):
+    """Returns true if all the cached properties that apply to `datafield`
+    are cached.
+    """
+    keys = []
+    for name in CACHED_PROPERTIES:
+        if name in LEXICON_PROPERTIES and not datafield.lexicon:
+            continue
+        key = getattr(DataField, name).get_key(datafield)
+        # Cannot be cached, so it is never missing
+        if key is not None:
+            keys.append(key)
+    return len(get_many_cached(keys)) == len(keys)
 
 
 class Command(BaseCommand):
@@ -15,6 +73,15 @@ class Command(BaseCommand):
         Finds all models referenced by the app, model or field `labels` and
         explicitly updates various cached properties relative to the
         `data_modified` on `DataField` instances.
+
+    OPTIONS:
+
+        `--workers` - The number of processes to update the fields with. Each
+        process uses its own database connection. The fields are ordered by
+        the estimated cost of updating them, most expensive first.
+
+        `--only-missing` - Only updates fields that do not have all their
+        cached properties cached for the current version.
     """
 
     help = '\n'.join([
@@ -25,12 +92,25 @@ class Command(BaseCommand):
 
     args = 'app [app.model, [app.model.field, [...]]]'
 
-    def _progress(self):
-        sys.stdout.write('.')
+    option_list = BaseCommand.option_list + (
+        make_option('-w', '--workers', type='int', dest='workers', default=1,
+            help='Number of processes to update the fields with'),
+
+        make_option('-m', '--only-missing', action='store_true',
+            dest='only_missing', default=False,
+            help='Only update fields that are not already cached'),
+    )
+
+    def _progress(self, datafield, seconds):
+        sys.stdout.write('{0}\t{1:.2f}s\n'.format('.'.join(datafield.natural_key()),
+            seconds))
         sys.stdout.flush()
 
     def handle(self, *args, **options):
         "Handles app_label or app_label.model_label formats."
+        workers = options.get('workers') or 1
+        only_missing = options.get('only_missing')
+
         conditions = []
 
         for label in args:
@@ -56,17 +136,48 @@ class Command(BaseCommand):
                 q = q | x
             fields = fields.filter(q).distinct()
 
-        count = 0
-        for datafield in fields:
-            datafield.size
-            self._progress()
-            datafield.labels
-            self._progress()
-            datafield.values
-            self._progress()
-            if datafield.lexicon:
-                datafield.coded
-                self._progress()
-            count += 1
-
-        print('{0} DataFields have been updated'.format(count))
+        fields = list(fields)
+
+        if only_missing:
+            fields = [f for f in fields if not is_cached(f)]
+
+        # Most expensive first so the longest running fields do not end
+        # up being processed last
+        costs = estimate_costs(fields)
+        fields.sort(key=lambda f: costs[f.pk], reverse=True)
+
+        lookup = dict((f.pk, f) for f in fields)
+        pks = [f.pk for f in fields]
+
+        start = time.time()
+
+        if workers > 1 and len(pks) > 1:
+            # Close the database and cache connections so each process opens
+            # its own rather than sharing the inherited one
+            for connection in connections.all():
+                connection.close()
+            close_cache()
+            pool = Pool(min(workers, len(pks)))
+            try:
+                for pk, seconds in pool.imap_unordered(cache_field, pks):
+                    self._progress(lookup[pk], seconds)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            # Resolve the cached properties in bulk rather than one key at a
+            # time. The time reported is the average for the batch.
+            for i in xrange(0, len(fields), PREFETCH_BATCH_SIZE):
+                batch = fields[i:i + PREFETCH_BATCH_SIZE]
+                batch_start = time.time()
+                prefetch_cached(batch, *CACHED_PROPERTIES)
+                seconds = (time.time() - batch_start) / len(batch)
+                for datafield in batch:
+                    self._progress(datafield, seconds)
+
+        elapsed = time.time() - start
+        count = len(pks)
+        rate = count / elapsed if elapsed else 0
+
+        print('{0} DataFields have been updated in {1:.2f}s ({2:.2f} fields/s)'\
+            .format(count, elapsed, rate))
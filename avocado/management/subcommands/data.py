@@ -3,6 +3,7 @@ from optparse import make_option
 from django.db.models import Q
 from django.core.management.base import BaseCommand
 from avocado.models import DataField
+from avocado.core.cache import incr_generation
 
 
 class Command(BaseCommand):
@@ -22,6 +23,10 @@ class Command(BaseCommand):
         `--modified` - Updates the `data_modified` on `DataField` instances
         corresponding the labels. This is primarily used for cache
         invalidation.
+
+        `--generation` - Increments the cache generation of each model
+        corresponding to the labels. This invalidates all cached data derived
+        from the models without updating any `DataField` instances.
     """
 
     help = '\n'.join([
@@ -36,14 +41,19 @@ class Command(BaseCommand):
         make_option('-m', '--modified', action='store_true',
             dest='update_data_modified', default=False,
             help='Update `data_modified` timestamp on `DataField` instances'),
+
+        make_option('-g', '--generation', action='store_true',
+            dest='update_generation', default=False,
+            help='Increment the cache generation of the models'),
     )
 
     def handle(self, *args, **options):
         "Handles app_label or app_label.model_label formats."
 
         update_data_modified = options['update_data_modified']
+        update_generation = options['update_generation']
 
-        if not update_data_modified:
+        if not update_data_modified and not update_generation:
             print 'Nothing to do.'
             return
 
@@ -71,5 +81,14 @@ class Command(BaseCommand):
             for x in conditions:
                 q = q | x
             fields = DataField.objects.filter(q)
-        updated = fields.update(data_modified=datetime.now())
-        print '{0} DataFields have been updated'.format(updated)
+
+        if update_generation:
+            models = fields.values_list('app_name', 'model_name')\
+                .order_by().distinct()
+            for app_name, model_name in models:
+                incr_generation('{0}.{1}'.format(app_name, model_name))
+            print '{0} models have been invalidated'.format(len(models))
+
+        if update_data_modified:
+            updated = fields.update(data_modified=datetime.now())
+            print '{0} DataFields have been updated'.format(updated)
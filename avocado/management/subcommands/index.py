@@ -0,0 +1,72 @@
+import sys
+import time
+from django.db.models import Q
+from django.core.management.base import BaseCommand, CommandError
+from avocado.conf import settings
+from avocado.models import DataField
+from avocado.core.index import build_index
+
+
+class Command(BaseCommand):
+    """
+    SYNOPSIS::
+
+        python manage.py avocado index [options...] labels...
+
+    DESCRIPTION:
+
+        Finds all searchable fields referenced by the app, model or field
+        `labels` and builds the value index used by `DataField.search` for
+        the current `data_modified` of each field. Indexes for previous
+        versions are removed. The `VALUE_INDEX_DIR` setting must be defined.
+    """
+
+    help = '\n'.join([
+        'Finds all searchable fields referenced by the app, model or field',
+        '`labels` and builds the value index used by `DataField.search`.',
+    ])
+
+    args = 'app [app.model, [app.model.field, [...]]]'
+
+    def handle(self, *args, **options):
+        "Handles app_label or app_label.model_label formats."
+        if not settings.VALUE_INDEX_DIR:
+            raise CommandError('The VALUE_INDEX_DIR setting must be defined')
+
+        conditions = []
+
+        for label in args:
+            labels = label.split('.')
+
+            # Specific field
+            if len(labels) == 3:
+                app, model, field = labels
+                conditions.append(Q(app_name=app, model_name=model, field_name=field))
+            # All fields for a model
+            elif len(labels) == 2:
+                app, model = labels
+                conditions.append(Q(app_name=app, model_name=model))
+            # All fields for each model in the app
+            else:
+                app = labels[0]
+                conditions.append(Q(app_name=app))
+
+        fields = DataField.objects.filter(enumerable=False)
+        if conditions:
+            q = Q()
+            for x in conditions:
+                q = q | x
+            fields = fields.filter(q).distinct()
+
+        count = 0
+        for datafield in fields:
+            if not datafield.searchable:
+                continue
+            start = time.time()
+            index = build_index(datafield)
+            sys.stdout.write('{0}\t{1} values\t{2:.2f}s\n'.format(
+                '.'.join(datafield.natural_key()), len(index),
+                time.time() - start))
+            count += 1
+
+        print('{0} DataFields have been indexed'.format(count))
@@ -45,8 +45,9 @@ class Command(BaseCommand):
             raise CommandError('The field {0} could not be found.'.format(field_label))
 
         count = 0
-        values = list(datafield.values)
-        values.sort(key=coerce_float)
+        # Stream the values rather than loading and caching them since
+        # this is a one-off process on potentially many values
+        values = sorted(datafield.iter_values(), key=coerce_float)
 
         for value in values:
             if value is None or value == '':
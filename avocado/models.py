@@ -1,5 +1,7 @@
 import re
-from django.db import models
+import hashlib
+from collections import namedtuple
+from django.db import models, connections, router
 from django.contrib.sites.models import Site
 from django.contrib.auth.models import User, Group
 from django.utils.encoding import smart_unicode
@@ -7,10 +9,14 @@ from django.utils.translation import ugettext_lazy as _
 from django.db.models.fields import FieldDoesNotExist
 from django.db.models.signals import post_save, pre_delete
 from django.core.validators import RegexValidator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import simplejson as json
 from avocado.core import utils
 from avocado.core.models import Base, BasePlural
+from avocado.core.index import get_index as get_value_index
 from avocado.core.cache import (post_save_cache, pre_delete_uncache,
-    cached_property)
+    cached_property, get_generation, instance_cache_key, instance_memo,
+    get_cached, set_cached)
 from avocado.conf import settings
 from avocado.managers import (DataFieldManager, DataConceptManager,
     DataCategoryManager)
@@ -20,6 +26,7 @@ from avocado.query.operators import registry as operators
 from avocado.lexicon.models import Lexicon
 from avocado.sets.models import ObjectSet
 from avocado.stats.agg import Aggregator
+from avocado.stats.hll import HyperLogLog
 from avocado.formatters import registry as formatters
 from avocado.queryview import registry as queryviews
 
@@ -30,12 +37,80 @@ __all__ = ('DataCategory', 'DataConcept', 'DataField',
 
 SIMPLE_TYPE_MAP = settings.SIMPLE_TYPE_MAP
 
+# Maximum number of values in a single `IN` query when resolving labels
+LABEL_QUERY_BATCH_SIZE = 500
+
 
 ident_re = re.compile(r'^[a-zA-Z][a-zA-Z0-9_]*$')
 validate_ident = RegexValidator(ident_re, _("Enter a valid 'identifier' " \
     "that is a valid Python variable name."), 'invalid')
 
 
+# Resolved model and field information for a DataField natural key. This
+# is derived purely from the installed models, so it is resolved once per
+# key rather than on every property access.
+FieldDescriptor = namedtuple('FieldDescriptor', ('real_model', 'real_field',
+    'model', 'field', 'lexicon', 'objectset', 'internal_type', 'simple_type'))
+
+_field_descriptors = {}
+
+
+def get_field_descriptor(app_name, model_name, field_name):
+    "Returns the `FieldDescriptor` for a DataField natural key."
+    key = (app_name, model_name, field_name)
+    descriptor = _field_descriptors.get(key)
+    if descriptor is not None:
+        return descriptor
+
+    real_model = models.get_model(app_name, model_name)
+    real_field = model = field = internal_type = None
+
+    if real_model:
+        try:
+            real_field = real_model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            pass
+
+        # Handle foreign key fields to a Lexicon model
+        if real_field and isinstance(real_field, models.ForeignKey) \
+                and issubclass(real_field.rel.to, Lexicon):
+            model = real_field.rel.to
+        else:
+            model = real_model
+
+        if issubclass(model, (Lexicon, ObjectSet)):
+            field = model._meta.pk
+        else:
+            field = real_field
+
+    if field:
+        internal_type = utils.get_internal_type(field)
+
+    is_pk = bool(field) and field == model._meta.pk
+
+    descriptor = FieldDescriptor(real_model, real_field, model, field,
+        lexicon=is_pk and issubclass(model, Lexicon),
+        objectset=is_pk and issubclass(model, ObjectSet),
+        internal_type=internal_type,
+        simple_type=SIMPLE_TYPE_MAP.get(internal_type, internal_type))
+
+    # Models may not be loaded yet, so only found models are retained
+    if real_model:
+        _field_descriptors[key] = descriptor
+    return descriptor
+
+
+# Mappings of values to codes for lexicon fields keyed by the primary key
+# of the DataField. The mappings are shared by all instances in the process
+# and are replaced when the data version of the field changes.
+_code_indexes = {}
+
+
+def clear_field_descriptor(sender, instance, **kwargs):
+    "Removes the `FieldDescriptor` for the natural key of a saved DataField."
+    _field_descriptors.pop(instance.natural_key(), None)
+
+
 class DataCategory(Base):
     "A high-level organization for data concepts."
     # A reference to a parent for hierarchical categories
@@ -126,6 +201,8 @@ class DataField(BasePlural):
         return self.default_name()
 
     def __len__(self):
+        if settings.SIZE_ESTIMATE_ENABLED:
+            return self.size_estimate
         return self.size
 
     def __nonzero__(self):
@@ -172,41 +249,53 @@ class DataField(BasePlural):
             model_name = model_name.title()
         return '{0} {1}'.format(model_name, field_name)
 
+    @property
+    def model_label(self):
+        """Returns the label of the model this datafield is associated with,
+        e.g. 'library.book'. This is used as the label for the cache
+        generation of the data derived from the model.
+        """
+        return '{0}.{1}'.format(self.app_name, self.model_name)
+
+    @property
+    def data_version(self):
+        """Returns the version of the underlying data for this datafield
+        derived from `data_modified` and the cache generation of the model.
+        `None` is returned if `data_modified` is not set since the data
+        cannot be reliably versioned.
+        """
+        if self.data_modified is None:
+            return
+        return '{0}-{1}'.format(self.data_modified.isoformat(),
+            get_generation(self.model_label))
+
     # Django Model Field-related Properties and Methods
 
+    @property
+    def descriptor(self):
+        "Returns the `FieldDescriptor` for this datafield."
+        return get_field_descriptor(self.app_name, self.model_name,
+            self.field_name)
+
     @property
     def real_model(self):
         "Returns the model class this datafield is associated with."
-        if not hasattr(self, '_real_model'):
-            self._real_model = models.get_model(self.app_name, self.model_name)
-        return self._real_model
+        return self.descriptor.real_model
 
     @property
     def real_field(self):
         "Returns the field object this datafield is associated with."
-        if self.real_model:
-            try:
-                return self.real_model._meta.get_field(self.field_name)
-            except FieldDoesNotExist:
-                pass
+        return self.descriptor.real_field
 
     @property
     def model(self):
         "Returns the model class this datafield represents."
-        real_field = self.real_field
-        # Handle foreign key fields to a Lexicon model
-        if real_field and isinstance(real_field, models.ForeignKey) \
-                and issubclass(real_field.rel.to, Lexicon):
-            return real_field.rel.to
-        return self.real_model
+        return self.descriptor.model
 
     @property
     def field(self):
         "Returns the field object this datafield represents."
-        model = self.model
-        if model and issubclass(model, (Lexicon, ObjectSet)):
-            return model._meta.pk
-        return self.real_field
+        return self.descriptor.field
 
     @property
     def nullable(self):
@@ -216,7 +305,7 @@ class DataField(BasePlural):
     @property
     def internal_type(self):
         "Returns the internal type of the field this datafield represents."
-        return utils.get_internal_type(self.field)
+        return self.descriptor.internal_type
 
     @property
     def simple_type(self):
@@ -225,7 +314,7 @@ class DataField(BasePlural):
         By default, it will use the field's internal type, but can be
         overridden by the ``SIMPLE_TYPE_MAP`` setting.
         """
-        return SIMPLE_TYPE_MAP.get(self.internal_type, self.internal_type)
+        return self.descriptor.simple_type
 
     @property
     def lexicon(self):
@@ -233,8 +322,7 @@ class DataField(BasePlural):
         is the pk field. All other fields on the class are treated as
         normal datafields.
         """
-        return self.model and issubclass(self.model, Lexicon) \
-            and self.field == self.model._meta.pk
+        return self.descriptor.lexicon
 
     @property
     def objectset(self):
@@ -242,8 +330,7 @@ class DataField(BasePlural):
         is the pk field. All other fields on the class are treated as
         normal datafields.
         """
-        return self.model and issubclass(self.model, ObjectSet) \
-            and self.field == self.model._meta.pk
+        return self.descriptor.objectset
 
     @property
     def searchable(self):
@@ -262,15 +349,47 @@ class DataField(BasePlural):
         return self.model.objects.values_list(self.field_name, flat=True)\
             .order_by(self.field_name).distinct()
 
-    def search(self, query):
-        "Rudimentary search for string-based values."
+    def search(self, query, limit=None):
+        """Rudimentary search for string-based values. If a value index has
+        been built for this field, the ranked results are returned from it.
+        """
         if self.simple_type == 'string' or self.lexicon:
+            if self.searchable:
+                index = get_value_index(self)
+                if index is not None:
+                    return iter(index.search(query, limit))
             if self.lexicon:
                 field_name = 'value'
             else:
                 field_name = self.field_name
             filters = {'{0}__icontains'.format(field_name): query}
-            return self.values_list.filter(**filters).iterator()
+            queryset = self.values_list.filter(**filters)
+            if limit:
+                queryset = queryset[:limit]
+            return queryset.iterator()
+
+    def iter_choices(self, chunk_size=None):
+        """Returns an iterator of the distinct (value, label) pairs for this
+        field. The rows are streamed from the database `chunk_size` at a time
+        rather than loaded into memory all at once.
+        """
+        if self.lexicon:
+            queryset = self.model.objects.values_list('pk', 'label')
+        elif self.objectset:
+            queryset = self.model.objects.values_list('pk', 'name')
+        else:
+            return ((value, smart_unicode(value))
+                for value in self.iter_values(chunk_size))
+        return utils.iter_queryset(queryset, chunk_size)
+
+    def iter_values(self, chunk_size=None):
+        "Returns an iterator of the distinct values for this field."
+        return (row[0] for row in
+            utils.iter_queryset(self.values_list, chunk_size))
+
+    def iter_labels(self, chunk_size=None):
+        "Returns an iterator of the labels corresponding to the values."
+        return (label for value, label in self.iter_choices(chunk_size))
 
     def get_plural_unit(self):
         if self.unit_plural:
@@ -285,50 +404,159 @@ class DataField(BasePlural):
         """Gets the label for a particular raw data value.
         If this is classified as `searchable`, a database hit will occur.
         """
-        if self.searchable:
-            kwargs = {self.field_name: value}
-            if self.lexicon:
-                return self.model.objects.filter(**kwargs)\
-                    .values_list('label', flat=True)[0]
-            if self.objectset:
-                return self.model.objects.filter(**kwargs)\
-                    .values_list('name', flat=True)[0]
-            return smart_unicode(value)
-        return dict(self.choices)[value]
+        return self.get_labels([value])[value]
+
+    def get_labels(self, values):
+        """Returns a dict of labels keyed by the raw data `values`. Values
+        that do not exist are not included. If this is classified as
+        `searchable`, the labels are queried in batches of `IN` queries,
+        otherwise they are resolved from the label index.
+        """
+        if not self.searchable:
+            index = self._get_label_index()
+            return dict((x, index[x]) for x in values if x in index)
+
+        if self.lexicon:
+            label_field = 'label'
+        elif self.objectset:
+            label_field = 'name'
+        else:
+            return dict((x, smart_unicode(x)) for x in values)
+
+        values = list(set(values))
+        labels = {}
+        lookup = '{0}__in'.format(self.field_name)
+
+        for i in xrange(0, len(values), LABEL_QUERY_BATCH_SIZE):
+            batch = values[i:i + LABEL_QUERY_BATCH_SIZE]
+            labels.update(self.model.objects.filter(**{lookup: batch})\
+                .values_list(self.field_name, label_field))
+
+        return labels
+
+    def _get_label_index(self):
+        # The index is kept on the instance for the `data_modified` it was
+        # resolved for to prevent a cache lookup per label
+        memo = instance_memo(self)
+        data_modified, index = memo.get('label_index', (None, None))
+        if index is None or data_modified != self.data_modified:
+            index = self.label_index
+            memo['label_index'] = (self.data_modified, index)
+        return index
+
+    def get_code(self, value):
+        """Gets the code for a particular raw data value of a lexicon field.
+        A `KeyError` is raised if the value does not have a code.
+        """
+        index = self._get_code_index()
+        if index is None:
+            raise KeyError(value)
+        return index[value]
+
+    def get_codes(self, values):
+        """Returns a dict of codes keyed by the raw data `values` of a lexicon
+        field. Values that do not have a code are not included.
+        """
+        index = self._get_code_index()
+        if index is None:
+            return {}
+        return dict((x, index[x]) for x in values if x in index)
+
+    def _get_code_index(self):
+        memo = instance_memo(self)
+        data_modified, index = memo.get('code_index', (None, None))
+        if index is not None and data_modified == self.data_modified:
+            return index
+
+        version = self.data_version
+        shared = _code_indexes.get(self.pk)
+
+        if version is not None and shared and shared[0] == version:
+            index = shared[1]
+        else:
+            index = self.code_index
+            if version is not None:
+                _code_indexes[self.pk] = (version, index)
+
+        memo['code_index'] = (self.data_modified, index)
+        return index
 
     # Data-related Cached Properties
     # These may be cached until the underlying data changes
 
-    @cached_property('size', version='data_modified')
+    @cached_property('size', version='data_modified',
+        generation='model_label')
     def size(self):
         "Returns the count of distinct values."
         return self.values_list.count()
 
-    @cached_property('values', version='data_modified')
+    @cached_property('size_sketch', version='data_modified',
+        generation='model_label')
+    def size_sketch(self):
+        "Returns a `HyperLogLog` sketch of the distinct values."
+        return self.get_sketch()
+
+    @property
+    def size_estimate(self):
+        "Returns the approximate count of distinct values."
+        return len(self.size_sketch)
+
+    def get_sketch(self, queryset=None, error=None):
+        """Builds a `HyperLogLog` sketch of the distinct values of this field
+        from a streaming scan of `queryset`, defaulting to all rows of the
+        model. Sketches of separate partitions of the rows can be merged.
+        """
+        if queryset is None:
+            queryset = self.model.objects.all()
+
+        if self.lexicon or self.objectset:
+            field_name = 'pk'
+        else:
+            field_name = self.field_name
+
+        # No ordering or distinct so the rows are simply scanned
+        queryset = queryset.values_list(field_name).order_by()
+
+        sketch = HyperLogLog(error or settings.SIZE_ESTIMATE_ERROR)
+        sketch.update(row[0] for row in utils.iter_queryset(queryset))
+        return sketch
+
+    @cached_property('values', version='data_modified',
+        generation='model_label')
     def values(self):
         "Returns a distinct list of the values."
-        return tuple(self.values_list)
+        return tuple(self.iter_values())
 
-    @cached_property('labels', version='data_modified')
+    @cached_property('labels', version='data_modified',
+        generation='model_label')
     def labels(self):
         """Returns an ordered set of labels corresponding to the values.
         If this field represents to a Lexicon subclass, the `label` field
         will be used, otherwise the values will simply be unicoded.
         """
-        if self.lexicon:
-            return tuple(self.model.objects.values_list('label', flat=True))
-        if self.objectset:
-            return tuple(self.model.objects.values_list('name', flat=True))
-        # Unicode each value, use an iterator here to prevent loading the
-        # raw values in memory
-        return map(smart_unicode, iter(self.values_list))
-
-    @cached_property('codes', version='data_modified')
+        return tuple(self.iter_labels())
+
+    @cached_property('codes', version='data_modified',
+        generation='model_label')
     def codes(self):
         "Returns a distinct set of coded values for this field"
         if self.lexicon:
             return tuple(self.model.objects.values_list('code', flat=True))
 
+    @cached_property('label_index', version='data_modified',
+        generation='model_label')
+    def label_index(self):
+        "Returns a dict of labels keyed by value for this field."
+        return dict(self.iter_choices())
+
+    @cached_property('code_index', version='data_modified',
+        generation='model_label')
+    def code_index(self):
+        "Returns a dict of codes keyed by value for this lexicon field."
+        if self.lexicon:
+            return dict(utils.iter_queryset(self.model.objects\
+                .values_list('pk', 'code')))
+
     @property
     def choices(self):
         "Returns a distinct set of choices for this field."
@@ -347,6 +575,92 @@ class DataField(BasePlural):
             return zip(self.values, self.codes)
 
     # Data Aggregation Properties
+    def _data_cache_key(self, label, context=None, params=None):
+        """Returns the cache key for data derived from this field relative to
+        the data version, the `context` and arbitrary `params`. `None` is
+        returned if the data cannot be reliably cached.
+        """
+        if not self.pk:
+            return
+        version = self.data_version
+        if version is None:
+            return
+        context_key = None
+        if context is not None:
+            context_key = context.cache_key(label, tree=self.model)
+            if context_key is None:
+                return
+        data = json.dumps([context_key, params], sort_keys=True,
+            cls=DjangoJSONEncoder)
+        version = '{0}-{1}'.format(version, hashlib.sha1(data).hexdigest())
+        return instance_cache_key(self, label=label, version=version)
+
+    def _aggregator(self, context=None):
+        aggregator = Aggregator(self.field)
+        if context is not None:
+            aggregator = aggregator.apply(context.apply(tree=self.model))
+        return aggregator
+
+    def summary(self, *groupby, **kwargs):
+        """Returns the applicable statistics for this field computed in a
+        single aggregate query, optionally grouped by `groupby` and for the
+        objects the DataContext `context` applies to. The counts of values,
+        NULL values and distinct values are always included. The result is
+        cached relative to the data version and the context.
+        """
+        context = kwargs.get('context')
+
+        key = self._data_cache_key('summary', context, groupby)
+        if key is not None:
+            data = get_cached(key)
+            if data is not None:
+                return data
+
+        aggregator = self._aggregator(context).count(*groupby)\
+            .count(*groupby, distinct=True).total(*groupby)\
+            .min(*groupby).max(*groupby)
+
+        if self.simple_type == 'number':
+            aggregator = aggregator.avg(*groupby).sum(*groupby)
+            # SQLite does not implement the STDDEV and VARIANCE functions
+            if connections[router.db_for_read(self.model)].vendor != 'sqlite':
+                aggregator = aggregator.stddev(*groupby).variance(*groupby)
+
+        data = []
+        for row in aggregator:
+            row['null_count'] = row.pop('total') - row['count']
+            data.append(row)
+
+        if key is not None:
+            set_cached(key, data)
+        return data
+
+    def histogram(self, bins=10, method=None, context=None):
+        """Returns the bins of the distribution of values for numeric, date
+        and datetime fields (see `Aggregator.bin`) for the objects the
+        DataContext `context` applies to. The `method` defaults to 'width'
+        for numbers and 'month' for dates. The result is cached relative to
+        the data version and the context.
+        """
+        if self.simple_type == 'number':
+            method = method or 'width'
+        elif self.simple_type in ('date', 'datetime'):
+            method = method or 'month'
+        else:
+            return
+
+        key = self._data_cache_key('histogram', context, [bins, method])
+        if key is not None:
+            data = get_cached(key)
+            if data is not None:
+                return data
+
+        data = self._aggregator(context).bin(bins, method)
+
+        if key is not None:
+            set_cached(key, data)
+        return data
+
     def groupby(self, *args):
         return Aggregator(self.field).groupby(*args)
 
@@ -463,12 +777,9 @@ class DataConcept(BasePlural):
 
     objects = DataConceptManager()
 
-    def format(self, *args, **kwargs):
-        """Convenience method for formatting data relative to this concept's
-        associated formatter. To prevent redundant initializations (say, in
-        a tight loop) the formatter instance is cached until the formatter
-        name changes.
-        """
+    def _get_formatter(self):
+        # To prevent redundant initializations (say, in a tight loop) the
+        # formatter instance is cached until the formatter name changes.
         name = self.formatter_name
         cache = getattr(self, '_formatter_cache', None)
         if not cache or name != cache[0]:
@@ -476,7 +787,19 @@ class DataConcept(BasePlural):
             self._formatter_cache = (name, formatter)
         else:
             formatter = cache[1]
-        return formatter(*args, **kwargs)
+        return formatter
+
+    def format(self, *args, **kwargs):
+        """Convenience method for formatting data relative to this concept's
+        associated formatter.
+        """
+        return self._get_formatter()(*args, **kwargs)
+
+    def format_batch(self, *args, **kwargs):
+        """Convenience method for formatting a block of rows column-wise
+        relative to this concept's associated formatter.
+        """
+        return self._get_formatter().format_batch(*args, **kwargs)
 
     class Meta(object):
         app_label = 'avocado'
@@ -576,3 +899,5 @@ post_save.connect(post_save_cache, sender=DataCategory)
 pre_delete.connect(pre_delete_uncache, sender=DataField)
 pre_delete.connect(pre_delete_uncache, sender=DataConcept)
 pre_delete.connect(pre_delete_uncache, sender=DataCategory)
+
+post_save.connect(clear_field_descriptor, sender=DataField)
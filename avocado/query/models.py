@@ -1,8 +1,14 @@
+import hashlib
 import jsonfield
 from django.db import models
+from django.utils import simplejson as json
+from django.core.serializers.json import DjangoJSONEncoder
 from modeltree.tree import trees
+from avocado.core.cache import get_cached, set_cached
 from . import parsers
 
+CONTEXT_CACHE_KEY = 'avocado.context:{0}-{1}'
+
 
 class AbstractDataContext(models.Model):
     """JSON object representing one or more data field conditions. The data may
@@ -67,6 +73,64 @@ class AbstractDataContext(models.Model):
     def language(self, tree=None, **context):
         return self.parse(tree=tree, **context).language
 
+    def cache_key(self, label, tree=None, **context):
+        """Returns a cache key for data derived from this context relative to
+        `tree`. The key is a hash of the canonical form of the context (see
+        `parsers.datacontext.canonicalize`) combined with the data version
+        of each referenced `DataField`, thus logically identical contexts
+        share the same key and it changes when any of the data changes.
+
+        `None` is returned if no fields are referenced or one of them is not
+        versioned since the data cannot be reliably cached.
+        """
+        fields = []
+        canonical = parsers.datacontext.canonicalize(self.json, fields=fields,
+            **context)
+
+        versions = set()
+        for f in fields:
+            version = f.data_version
+            if version is None:
+                return
+            versions.add(version)
+
+        if not versions:
+            return
+
+        tree = trees[tree]
+        opts = tree.root_model._meta
+        tree_label = '{0}.{1}.{2}'.format(tree.alias, opts.app_label,
+            opts.module_name)
+
+        data = json.dumps([canonical, sorted(versions), tree_label],
+            sort_keys=True, cls=DjangoJSONEncoder)
+        return CONTEXT_CACHE_KEY.format(hashlib.sha1(data).hexdigest(), label)
+
+    def _get_cached(self, label, func, tree=None, **context):
+        key = self.cache_key(label, tree=tree, **context)
+        if key is None:
+            return func()
+        data = get_cached(key)
+        if data is None:
+            data = func()
+            set_cached(key, data)
+        return data
+
+    def get_count(self, tree=None, **context):
+        """Returns the count of distinct objects this context applies to.
+        The count is cached relative to the canonical form of this context
+        and the data versions of the fields (see `cache_key`).
+        """
+        return self._get_cached('count', lambda: self.apply(tree=tree,
+            **context).count(), tree=tree, **context)
+
+    def get_pks(self, tree=None, **context):
+        """Returns the list of primary keys of the distinct objects this
+        context applies to. The list is cached like `get_count`.
+        """
+        return self._get_cached('pks', lambda: list(self.apply(tree=tree,
+            **context).values_list('pk', flat=True)), tree=tree, **context)
+
 
 class AbstractDataView(models.Model):
     """JSON object representing one or more data field conditions. The data may
@@ -1,4 +1,6 @@
 from modeltree.tree import trees
+from django.utils import simplejson as json
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.exceptions import ValidationError
 
 AND = 'AND'
@@ -7,6 +9,8 @@ BRANCH_KEYS = ('children', 'type')
 CONDITION_KEYS = ('id', 'value')
 COMPOSITE_KEYS = ('id', 'composite')
 LOGICAL_OPERATORS = ('and', 'or')
+# Operators whose values are an unordered set
+SET_OPERATORS = ('in', '-in')
 
 
 def has_keys(obj, keys):
@@ -213,3 +217,61 @@ def parse(attrs, **context):
         node = Branch(attrs['type'], **context)
         node.children = map(lambda x: parse(x, **context), attrs['children'])
     return node
+
+
+def _sort_key(obj):
+    return json.dumps(obj, sort_keys=True, cls=DjangoJSONEncoder)
+
+
+def _normalize_value(value, operator=None):
+    "Normalizes a condition value for `canonicalize`."
+    # Only the value is relevant to the query, not the label
+    if isinstance(value, dict) and 'value' in value:
+        value = value['value']
+    if isinstance(value, (list, tuple)):
+        value = [_normalize_value(x) for x in value]
+        if operator in SET_OPERATORS:
+            unique = {}
+            for x in value:
+                unique.setdefault(_sort_key(x), x)
+            value = [unique[x] for x in sorted(unique)]
+    return value
+
+
+def canonicalize(attrs, fields=None, **context):
+    """Returns a canonical form of `attrs` such that logically identical
+    contexts have the same representation. Composite references are
+    expanded, condition ids are resolved to `DataField` primary keys, values
+    are normalized and branch children are sorted.
+
+    If `fields` is a list, the `DataField` instances referenced by the
+    conditions are appended to it.
+    """
+    if fields is None:
+        fields = []
+    if not attrs:
+        return {}
+    if is_composite(attrs):
+        from avocado.models import DataContext
+        if 'user' in context:
+            cxt = DataContext.objects.get(id=attrs['id'], user=context['user'])
+        else:
+            cxt = DataContext.objects.get(id=attrs['id'])
+        return canonicalize(cxt.json, fields=fields, **context)
+    if is_condition(attrs):
+        from avocado.models import DataField
+        field = DataField.objects.get_by_natural_key(attrs['id'])
+        fields.append(field)
+        operator = attrs.get('operator', None)
+        return {
+            'id': field.pk,
+            'operator': operator,
+            'value': _normalize_value(attrs['value'], operator),
+        }
+    children = [canonicalize(x, fields=fields, **context)
+        for x in attrs['children']]
+    children.sort(key=_sort_key)
+    return {
+        'type': attrs['type'].lower(),
+        'children': children,
+    }
@@ -1,11 +1,17 @@
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
 from django import forms
 from django.db import models
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.core.exceptions import ValidationError
 from modeltree.tree import trees
 from avocado.core import loader
 from avocado.conf import settings
 from avocado.core.utils import get_form_class
+from avocado.core.cache import instance_memo
 from .operators import registry as operators
 
 
@@ -52,13 +58,25 @@ class Translator(object):
         # Determine list of allowed operators
         return self.operators or OPERATOR_MAP[field.simple_type]
 
+    def _allowed_operators(self, field):
+        # The allowed operators are memoized on the field since they are
+        # only dependent on the field and translator
+        memo = instance_memo(field)
+        key = ('allowed_operators', self.__class__)
+
+        if key not in memo:
+            allowed_operators = tuple(self.get_operators(field))
+
+            # Special case for fields that are nullable
+            if field.field.null:
+                allowed_operators += ('isnull', '-isnull')
+
+            memo[key] = allowed_operators
+        return memo[key]
+
     def _validate_operator(self, field, uid, **kwargs):
         # Determine list of allowed operators
-        allowed_operators = self.get_operators(field)
-
-        # Special case for fields that are nullable
-        if field.field.null:
-            allowed_operators += ('isnull', '-isnull')
+        allowed_operators = self._allowed_operators(field)
 
         # If uid is None, the default operator will be used
         uid = uid or allowed_operators[0]
@@ -77,7 +95,10 @@ class Translator(object):
 
         return operator
 
-    def _validate_value(self, field, value, **kwargs):
+    def get_formfield(self, field, multiple=False, **kwargs):
+        """Returns the form field used for cleaning the value of a condition
+        for `field`. `multiple` denotes whether the value is a list of values.
+        """
         # If a form class is not specified, check to see if there is a custom
         # form_class specified for this datatype or if this translator has
         # one defined
@@ -96,12 +117,9 @@ class Translator(object):
         if isinstance(field.field, models.AutoField):
             kwargs.pop('form_class', None)
             queryset = field.objects
-            if hasattr(value, '__iter__'):
-                formfield = forms.ModelMultipleChoiceField(queryset, **kwargs)
-            else:
-                formfield = forms.ModelChoiceField(queryset, **kwargs)
-            cleaned_value = formfield.clean(value)
-            return cleaned_value
+            if multiple:
+                return forms.ModelMultipleChoiceField(queryset, **kwargs)
+            return forms.ModelChoiceField(queryset, **kwargs)
 
         # If this field is flagged as enumerable, use a select multiple
         # by default.
@@ -110,14 +128,34 @@ class Translator(object):
 
         # The model field instance has a convenience method called `formfield`
         # that is suited for the field type
-        formfield = field.field.formfield(**kwargs)
+        return field.field.formfield(**kwargs)
+
+    def _get_formfield(self, field, multiple, **kwargs):
+        # Form fields are memoized on the field unless options are passed
+        # since constructing them may require the choices of the field
+        if kwargs:
+            return self.get_formfield(field, multiple, **kwargs)
+
+        memo = instance_memo(field)
+        key = ('formfield', self.__class__, multiple)
+
+        if key not in memo:
+            memo[key] = self.get_formfield(field, multiple)
+        return memo[key]
+
+    def _validate_value(self, field, value, **kwargs):
+        multiple = hasattr(value, '__iter__')
+        formfield = self._get_formfield(field, multiple, **kwargs)
+
+        if isinstance(field.field, models.AutoField):
+            return formfield.clean(value)
 
         # Special case for ``None`` values since all form fields seem to handle
         # the conversion differently. Simply ignore the cleaning if ``None``,
         # this scenario occurs when a list of values are being queried and one
         # of them is to lookup NULL values. Note, the None is handled
         # downstream and is contained with the query directly.
-        if hasattr(value, '__iter__'):
+        if multiple:
             cleaned_value = []
             for x in value:
                 if x is not None:
@@ -130,6 +168,17 @@ class Translator(object):
             return cleaned_value
         return formfield.clean(value)
 
+    def _query_condition(self, tree, field, model_field, lookup, value):
+        """Returns a `Q` object for `model_field` relative to `tree`. The
+        query string of the field is memoized on the DataField `field`.
+        """
+        memo = instance_memo(field)
+        key = ('query_string', tree.alias, model_field)
+
+        if key not in memo:
+            memo[key] = tree.query_string_for_field(model_field)
+        return Q(**{'{0}__{1}'.format(memo[key], lookup): value})
+
     def _get_not_null_pk(self, field, tree):
         """The below logic is required to get the expected results back
         when querying for NULL values. Performing a LEFT OUTER JOIN will
@@ -144,7 +193,8 @@ class Translator(object):
         assumption is wrong.
         """
 
-        return tree.query_condition(field.model._meta.pk, 'isnull', False)
+        return self._query_condition(tree, field, field.model._meta.pk,
+            'isnull', False)
 
     def _condition(self, field, operator, value, tree):
         """Builds a `Q` object for `field` relative to `tree`.
@@ -180,7 +230,8 @@ class Translator(object):
 
             # Process a normal value
             if value is not None:
-                condition = tree.query_condition(field.field, operator.lookup, value)
+                condition = self._query_condition(tree, field, field.field,
+                    operator.lookup, value)
 
             # Reset value to None for `null` processing
             value = None
@@ -192,7 +243,8 @@ class Translator(object):
             if value is None:
                 value = True
             # Read the _get_not_null_pk docs for more info
-            null_condition = tree.query_condition(field.field, 'isnull', value)
+            null_condition = self._query_condition(tree, field, field.field,
+                'isnull', value)
 
             if field.model is not tree.root_model:
                 null_condition = null_condition & \
@@ -275,6 +327,101 @@ class Translator(object):
 
 registry = loader.Registry(default=Translator)
 
+
+def _error(attrs, messages):
+    "Returns the error result for the condition `attrs`."
+    return {
+        'id': attrs.get('id'),
+        'operator': attrs.get('operator'),
+        'value': attrs.get('value'),
+        'errors': messages,
+    }
+
+
+def _batch(method, conditions, tree, **context):
+    from avocado.models import DataField
+
+    conditions = list(conditions)
+    results = [None] * len(conditions)
+
+    # Resolve each distinct id once. Different ids may name the same field,
+    # e.g. its primary key and natural key.
+    resolved = {}
+
+    # Group the conditions by field so the per-field setup memoized on the
+    # instance is shared
+    groups = OrderedDict()
+
+    for i, attrs in enumerate(conditions):
+        if 'id' not in attrs:
+            results[i] = _error(attrs, ['Condition does not have an id'])
+            continue
+
+        key = attrs['id']
+        if isinstance(key, list):
+            key = tuple(key)
+
+        try:
+            if key not in resolved:
+                try:
+                    resolved[key] = DataField.objects\
+                        .get_by_natural_key(attrs['id'])
+                except (DataField.DoesNotExist,
+                        DataField.MultipleObjectsReturned, ValueError):
+                    resolved[key] = None
+        except TypeError:
+            results[i] = _error(attrs, ['"{0}" is not a valid ' \
+                'DataField id'.format(key)])
+            continue
+
+        field = resolved[key]
+        if field is None:
+            results[i] = _error(attrs, ['DataField "{0}" does not ' \
+                'exist'.format(attrs['id'])])
+            continue
+
+        # The first instance of the field is used for all its conditions
+        groups.setdefault(field.pk, (field, []))[1].append(i)
+
+    tree = trees[tree]
+
+    for field, indices in groups.itervalues():
+        translator = registry[field.translator]
+
+        for i in indices:
+            attrs = conditions[i]
+            try:
+                results[i] = getattr(translator, method)(field,
+                    attrs.get('operator'), attrs.get('value'), tree, **context)
+            except ValidationError, e:
+                results[i] = _error(attrs, e.messages)
+            # Unhashable or malformed operators and values
+            except (LookupError, TypeError, ValueError), e:
+                results[i] = _error(attrs, [unicode(e)])
+
+    return results
+
+
+def translate_many(conditions, tree=None, **context):
+    """Translates many `conditions` at once, each a dict with `id`, `operator`
+    and `value` keys as in a DataContext. The conditions are grouped by
+    DataField so the field, operators, form fields and query paths are only
+    resolved once per field.
+
+    Returns a list of results in the same order as `conditions`. Each result
+    is the output of `Translator.translate` or, if the condition is not
+    valid, a dict of the `id`, `operator`, `value` and a list of `errors`.
+    """
+    return _batch('translate', conditions, tree, **context)
+
+
+def validate_many(conditions, tree=None, **context):
+    """Validates many `conditions` at once like `translate_many`. Each result
+    is the (operator, value) pair returned by `Translator.validate` or a
+    dict of the `errors` if the condition is not valid.
+    """
+    return _batch('validate', conditions, tree, **context)
+
 # this will be invoked when it is imported by models.py to use the
 # registry choices
 loader.autodiscover('translators')
@@ -1,10 +1,18 @@
 from copy import deepcopy
-from django.db import models
+from datetime import datetime, timedelta
+from django.db import models, connections
+from django.db.backends.util import typecast_timestamp
 from django.db.models import Q, Count, Sum, Avg, Max, Min, StdDev, Variance
 from django.db.models.query import REPR_OUTPUT_SIZE
 from django.db.models.sql.constants import LOOKUP_SEP
 from modeltree.utils import M
 
+# Intervals date and datetime values can be binned by
+DATE_BIN_METHODS = ('day', 'week', 'month', 'year')
+
+# Methods numeric values can be binned by
+NUMBER_BIN_METHODS = ('width', 'quantile')
+
 
 class Aggregator(object):
     def __init__(self, field, model=None):
@@ -78,7 +86,7 @@ class Aggregator(object):
             self._result_cache = cache
             self._length = length
 
-    def _construct(self):
+    def _filtered(self):
         if self._queryset is None:
             queryset = self.model.objects.all()
         else:
@@ -87,6 +95,10 @@ class Aggregator(object):
             queryset = queryset.filter(*self._filter)
         if self._exclude:
             queryset = queryset.exclude(*self._exclude)
+        return queryset
+
+    def _construct(self):
+        queryset = self._filtered()
         if self._groupby:
             queryset = queryset.values(*self._groupby)
         if self._aggregates:
@@ -221,6 +233,11 @@ class Aggregator(object):
             aggregates = {'count': Count(self.field_name)}
         return self._aggregate(*groupby, **aggregates)
 
+    def total(self, *groupby):
+        "Performs a COUNT aggregation of all rows including NULL values."
+        aggregates = {'total': Count(self.model._meta.pk.name)}
+        return self._aggregate(*groupby, **aggregates)
+
     def sum(self, *groupby):
         "Performs an SUM aggregation."
         aggregates = {'sum': Sum(self.field_name)}
@@ -250,3 +267,157 @@ class Aggregator(object):
         "Performs an VARIANCE aggregation."
         aggregates = {'variance': Variance(self.field_name)}
         return self._aggregate(*groupby, **aggregates)
+
+    def _bin_counts(self, queryset, sql, params):
+        "Returns a dict of counts keyed by the bin `sql` expression."
+        queryset = queryset.extra(select={'bin': sql}, select_params=params)\
+            .values('bin').annotate(count=Count(self.model._meta.pk.name))\
+            .order_by('bin')
+        return dict((x['bin'], x['count']) for x in queryset)
+
+    def _column(self, queryset):
+        qn = connections[queryset.db].ops.quote_name
+        return '{0}.{1}'.format(qn(self.model._meta.db_table),
+            qn(self.field.column))
+
+    def _bin_width(self, queryset, bins):
+        stats = queryset.aggregate(min=Min(self.field_name),
+            max=Max(self.field_name))
+        lower, upper = stats['min'], stats['max']
+        if lower is None:
+            return []
+
+        lower, upper = float(lower), float(upper)
+        width = (upper - lower) / bins
+
+        if not width:
+            return [{'start': lower, 'end': upper,
+                'count': queryset.count()}]
+
+        # SQLite has no FLOOR function, but casting to an integer truncates
+        # toward zero which is the same since the offset is never negative.
+        # Other backends round when casting, so FLOOR is used.
+        connection = connections[queryset.db]
+        sql = '({0} - %s) / %s'.format(self._column(queryset))
+        if connection.vendor == 'sqlite':
+            sql = 'CAST({0} AS INTEGER)'.format(sql)
+        else:
+            sql = 'FLOOR({0})'.format(sql)
+
+        # The maximum value, and any value rounded past it, is included
+        # in the last bin
+        counts = {}
+        for key, count in self._bin_counts(queryset, sql,
+                (lower, width)).iteritems():
+            i = min(max(int(key), 0), bins - 1)
+            counts[i] = counts.get(i, 0) + count
+
+        return [{
+            'start': lower + i * width,
+            'end': upper if i == bins - 1 else lower + (i + 1) * width,
+            'count': counts.get(i, 0),
+        } for i in xrange(bins)]
+
+    def _bin_quantile(self, queryset, bins):
+        total = queryset.count()
+        if not total:
+            return []
+
+        values = queryset.order_by(self.field_name)\
+            .values_list(self.field_name, flat=True)
+
+        # Each edge is a separate LIMIT/OFFSET query which the database
+        # answers by walking the sorted values up to the offset, so this
+        # is O(n) per edge. Only the edges are fetched rather than all of
+        # the values. Duplicate edges are merged.
+        lower = values[0]
+        upper = values[total - 1]
+        edges = sorted(set(values[i * total // bins] for i in xrange(1, bins)))
+        edges = [x for x in edges if x != lower]
+
+        column = self._column(queryset)
+        whens = ' '.join('WHEN {0} < %s THEN {1}'.format(column, i)
+            for i in xrange(len(edges)))
+
+        if whens:
+            sql = 'CASE {0} ELSE {1} END'.format(whens, len(edges))
+        else:
+            sql = '0'
+
+        counts = self._bin_counts(queryset, sql, edges)
+        starts = [lower] + edges
+        ends = edges + [upper]
+
+        return [{
+            'start': starts[i],
+            'end': ends[i],
+            'count': counts.get(i, 0),
+        } for i in xrange(len(starts))]
+
+    def _bin_date(self, queryset, interval):
+        # Weeks are not supported by all backends, so the day counts are
+        # merged into weeks starting on Monday
+        trunc = 'day' if interval == 'week' else interval
+        connection = connections[queryset.db]
+        sql = connection.ops.date_trunc_sql(trunc, self._column(queryset))
+
+        counts = {}
+        for key, count in self._bin_counts(queryset, sql, ()).iteritems():
+            if key is None:
+                continue
+            if isinstance(key, basestring):
+                key = typecast_timestamp(key)
+            if isinstance(key, datetime) and \
+                    self.field.get_internal_type() == 'DateField':
+                key = key.date()
+            if interval == 'week':
+                key -= timedelta(days=key.weekday())
+            counts[key] = counts.get(key, 0) + count
+
+        bins = []
+        for start in sorted(counts):
+            if interval in ('day', 'week'):
+                end = start + timedelta(days=7 if interval == 'week' else 1)
+            elif interval == 'month':
+                if start.month == 12:
+                    end = start.replace(year=start.year + 1, month=1)
+                else:
+                    end = start.replace(month=start.month + 1)
+            else:
+                end = start.replace(year=start.year + 1)
+            bins.append({'start': start, 'end': end, 'count': counts[start]})
+        return bins
+
+    def bin(self, bins=10, method='width'):
+        """Returns a list of bins for the values, each containing the `start`
+        and `end` of the bin and the `count` of values in it. The binning is
+        performed by the database so only the counts are fetched. NULL values
+        are excluded.
+
+        For numeric fields the `method` can be 'width' for `bins` bins of
+        equal width or 'quantile' for `bins` bins containing approximately
+        the same number of values. For date and datetime fields, the `method`
+        is the interval the values are truncated to, 'day', 'week', 'month'
+        or 'year', and the `bins` are the non-empty intervals. A `ValueError`
+        is raised if the `method` does not apply to the field.
+        """
+        is_date = self.field.get_internal_type() in ('DateField',
+            'DateTimeField')
+
+        if method in NUMBER_BIN_METHODS and is_date:
+            raise ValueError('Bin method "{0}" does not apply to date ' \
+                'fields'.format(method))
+        if method in DATE_BIN_METHODS and not is_date:
+            raise ValueError('Bin method "{0}" only applies to date ' \
+                'fields'.format(method))
+
+        queryset = self._filtered().filter(**{
+            '{0}__isnull'.format(self.field_name): False})
+
+        if method == 'width':
+            return self._bin_width(queryset, bins)
+        if method == 'quantile':
+            return self._bin_quantile(queryset, bins)
+        if method in DATE_BIN_METHODS:
+            return self._bin_date(queryset, method)
+        raise ValueError('Unknown bin method "{0}"'.format(method))
@@ -0,0 +1,116 @@
+import math
+import hashlib
+from decimal import Decimal
+from django.utils.encoding import smart_str
+
+# Types that are normalized as numbers before hashing
+NUMBER_TYPES = (int, long, float, Decimal)
+
+
+class HyperLogLog(object):
+    """Sketch for estimating the number of distinct values added to it using
+    a fixed amount of memory. The `error` is the relative standard error of
+    the estimate which determines the number of registers, e.g. 0.01 uses
+    2 ** 14 (16 KB).
+
+    Sketches with the same precision can be merged, e.g. sketches built from
+    separate partitions of a table, which results in the sketch for all the
+    values added to either.
+    """
+    def __init__(self, error=0.01, precision=None):
+        if precision is None:
+            precision = int(math.ceil(2 * math.log(1.04 / error, 2)))
+        self.precision = min(max(precision, 4), 16)
+        self.registers = bytearray(1 << self.precision)
+
+    def __len__(self):
+        return self.count()
+
+    def __or__(self, other):
+        sketch = HyperLogLog(precision=self.precision)
+        sketch.registers[:] = self.registers
+        return sketch.merge(other)
+
+    @property
+    def error(self):
+        "Returns the relative standard error of the estimate."
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def _normalize(self, value):
+        """Returns a byte string representation of `value` that is equal for
+        values that are equal but of different types, e.g. 1 and 1L or 'a'
+        and u'a', so sketches built from different sources can be merged.
+        """
+        if isinstance(value, basestring):
+            return 's:' + smart_str(value)
+
+        if isinstance(value, NUMBER_TYPES):
+            try:
+                if value == int(value):
+                    return 'n:' + str(int(value))
+            # Infinity and NaN
+            except (OverflowError, ValueError):
+                pass
+            return 'n:' + repr(float(value))
+
+        return 'r:' + repr(value)
+
+    def _hash(self, value):
+        # Only the first 64 bits of the digest are used
+        return int(hashlib.sha1(self._normalize(value)).hexdigest()[:16], 16)
+
+    def add(self, value):
+        """Adds `value` to the sketch. `None` is ignored since null values
+        are not counted as distinct values, e.g. COUNT(DISTINCT).
+        """
+        if value is None:
+            return
+
+        x = self._hash(value)
+        bits = 64 - self.precision
+
+        # The first bits determine the register and the rank is position
+        # of the leftmost 1-bit of the remaining bits
+        index = x >> bits
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        "Adds each of `values` to the sketch."
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        "Merges the registers of the `other` sketch into this one."
+        if other.precision != self.precision:
+            raise ValueError('Sketches with different precisions cannot be merged')
+
+        registers = self.registers
+        for i, rank in enumerate(other.registers):
+            if rank > registers[i]:
+                registers[i] = rank
+        return self
+
+    def count(self):
+        "Returns the estimated number of distinct values."
+        m = len(self.registers)
+
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+
+        # Linear counting is more accurate for small cardinalities
+        zeros = self.registers.count('\x00')
+        if zeros and estimate <= 2.5 * m:
+            estimate = m * math.log(m / float(zeros))
+
+        return int(round(estimate))
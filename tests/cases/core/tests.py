@@ -2,11 +2,18 @@ import os
 from django.core import management
 from django.test import TestCase, TransactionTestCase
 from django.test.utils import override_settings
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
 from avocado.core.loader import Registry, AlreadyRegistered
-from avocado.core.paginator import BufferedPaginator
+from avocado.core.paginator import BufferedPaginator, BufferManager, \
+    KeysetPaginator
+from avocado.core.cache import LocalCache
+from avocado.core.cache.local import approximate_size
+from avocado.core.cache import chunked
 
-__all__ = ('RegistryTestCase', 'BufferedPaginatorTestCase')
+__all__ = ('RegistryTestCase', 'BufferedPaginatorTestCase',
+    'BufferManagerTestCase', 'KeysetPaginatorTestCase', 'LocalCacheTestCase',
+    'ChunkedCacheTestCase')
 
 class RegistryTestCase(TestCase):
     def setUp(self):
@@ -42,6 +49,87 @@ class RegistryTestCase(TestCase):
         self.assertRaises(ImproperlyConfigured, self.r.register, D)
 
 
+class LocalCacheTestCase(TestCase):
+    def test_max_entries(self):
+        c = LocalCache(max_entries=2, max_size=0)
+        c.set('a', 1)
+        c.set('b', 2)
+        # Mark 'a' as recently used so 'b' is evicted
+        self.assertEqual(c.get('a'), 1)
+        c.set('c', 3)
+
+        self.assertTrue('a' in c)
+        self.assertFalse('b' in c)
+        self.assertTrue('c' in c)
+        self.assertEqual(c.get('b'), None)
+
+        self.assertEqual(c.stats(), {
+            'entries': 2,
+            'size': c.size,
+            'hits': 1,
+            'misses': 1,
+            'evictions': 1,
+        })
+
+    def test_max_size(self):
+        value = tuple(range(100))
+        c = LocalCache(max_entries=0, max_size=approximate_size(value) * 2)
+        c.set('a', value)
+        c.set('b', value)
+        self.assertEqual(len(c), 2)
+        c.set('c', value)
+        self.assertEqual(len(c), 2)
+        self.assertFalse('a' in c)
+        self.assertEqual(c.evictions, 1)
+
+        # Values larger than the cache are not stored
+        c.set('d', tuple(range(1000)))
+        self.assertFalse('d' in c)
+        self.assertEqual(len(c), 2)
+
+    def test_clear(self):
+        c = LocalCache(max_entries=10)
+        c.set('a', 1)
+        c.get('a')
+        c.clear()
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.size, 0)
+        self.assertEqual(c.hits, 0)
+
+
+@override_settings(AVOCADO_CACHE_COMPRESS_MIN_SIZE=100,
+    AVOCADO_CACHE_CHUNK_SIZE=100)
+class ChunkedCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_small(self):
+        chunked.set_many(cache, {'small': (1, 2, 3)}, timeout=60)
+        self.assertEqual(cache.get('small'), (1, 2, 3))
+        self.assertEqual(chunked.get_many(cache, ['small']), {'small': (1, 2, 3)})
+
+    def test_compressed(self):
+        value = tuple([u'value'] * 1000)
+        chunked.set_many(cache, {'compressed': value}, timeout=60)
+        self.assertTrue(isinstance(cache.get('compressed'), chunked.CompressedValue))
+        self.assertEqual(chunked.get_many(cache, ['compressed']), {'compressed': value})
+
+    def test_chunked(self):
+        value = tuple(range(1000))
+        chunked.set_many(cache, {'large': value, 'small': 1}, timeout=60)
+
+        manifest = cache.get('large')
+        self.assertTrue(isinstance(manifest, chunked.ChunkManifest))
+        self.assertTrue(manifest.count > 1)
+
+        self.assertEqual(chunked.get_many(cache, ['large', 'small']),
+            {'large': value, 'small': 1})
+
+        # A missing chunk is a miss
+        cache.delete(manifest.chunk_keys('large')[-1])
+        self.assertEqual(chunked.get_many(cache, ['large', 'small']), {'small': 1})
+
+
 class BufferedPaginatorTestCase(TestCase):
     def test_base(self):
         kwargs = {
@@ -148,6 +236,132 @@ class BufferedPaginatorTestCase(TestCase):
         self.assertEqual(bp.get_overlap(70, 3), (False, (70, 3), (None, None)))
 
 
+class BufferManagerTestCase(TestCase):
+    def setUp(self):
+        self.rows = range(100)
+
+    def test_scroll(self):
+        bm = BufferManager(self.rows, per_page=2, buf_size=10, span=20)
+
+        self.assertEqual(bm.get(50), range(50, 60))
+        self.assertEqual(bm.fetched, 10)
+
+        # Only the missing end rows are fetched
+        self.assertEqual(bm.get(55), range(55, 65))
+        self.assertEqual(bm.fetched, 15)
+        self.assertEqual((bm.offset, len(bm.rows)), (50, 15))
+
+        # Only the missing start rows are fetched
+        self.assertEqual(bm.get(45), range(45, 55))
+        self.assertEqual(bm.fetched, 20)
+        self.assertEqual((bm.offset, len(bm.rows)), (45, 20))
+
+        # Buffered rows are not fetched again
+        self.assertEqual(bm.get(48, 5), range(48, 53))
+        self.assertEqual(bm.fetched, 20)
+
+        # Rows behind the scroll direction are evicted beyond the span
+        self.assertEqual(bm.get(60), range(60, 70))
+        self.assertEqual(bm.fetched, 25)
+        self.assertEqual((bm.offset, len(bm.rows)), (50, 20))
+        self.assertEqual(bm.rows, range(50, 70))
+
+        # No overlap replaces the buffer
+        self.assertEqual(bm.get(0), range(0, 10))
+        self.assertEqual(bm.rows, range(0, 10))
+        self.assertEqual(bm.fetched, 35)
+
+    def test_read_ahead(self):
+        bm = BufferManager(self.rows, per_page=2, buf_size=10, read_ahead=5)
+        self.assertEqual(bm.span, 15)
+
+        bm.get(50)
+        self.assertEqual(bm.get(52), range(52, 62))
+        self.assertEqual(bm.rows, range(52, 67))
+
+        # Within the read ahead rows
+        fetched = bm.fetched
+        self.assertEqual(bm.get(55), range(55, 65))
+        self.assertEqual(bm.fetched, fetched)
+
+        # End of the rows
+        self.assertEqual(bm.get(95), range(95, 100))
+
+    def test_page(self):
+        bm = BufferManager(self.rows, per_page=10, buf_size=10)
+        page = bm.page(3)
+        self.assertEqual(page.object_list, range(20, 30))
+        self.assertTrue(page.in_cache())
+        self.assertEqual(bm.page(4).object_list, range(30, 40))
+        self.assertEqual(bm.fetched, 20)
+
+
+class KeysetPaginatorTestCase(TestCase):
+    def setUp(self):
+        from avocado.models import DataField
+        # Duplicate sort values to ensure the pk is used as a tiebreaker
+        for i in range(10):
+            DataField(app_name='tests', model_name='keyset',
+                field_name='f{0}'.format(i), name=str(i % 3)).save()
+        self.queryset = DataField.objects.filter(model_name='keyset')\
+            .order_by('-name')
+
+    def test_ordering(self):
+        kp = KeysetPaginator(self.queryset, 3)
+        self.assertEqual(kp.ordering, ['-name', 'pk'])
+        self.assertEqual(kp.count, 10)
+        self.assertEqual(kp.num_pages, 4)
+
+    def test_pages(self):
+        expected = list(self.queryset.order_by('-name', 'pk'))
+
+        kp = KeysetPaginator(self.queryset, 3)
+        for number in kp.page_range:
+            page = kp.page(number)
+            start = (number - 1) * 3
+            self.assertEqual(page.object_list, expected[start:start + 3])
+            self.assertEqual(page.offset(), start)
+
+        self.assertEqual(sorted(kp.bounds.keys()), [1, 2, 3, 4])
+
+        # Previous pages are fetched relative to the next page
+        bounds = {4: kp.bounds[4]}
+        kp = KeysetPaginator(self.queryset, 3, bounds=bounds)
+        self.assertEqual(kp.page(3).object_list, expected[6:9])
+        self.assertEqual(kp.page(2).object_list, expected[3:6])
+
+    def test_orphans(self):
+        expected = list(self.queryset.order_by('-name', 'pk'))
+
+        kp = KeysetPaginator(self.queryset, 3, orphans=1)
+        self.assertEqual(kp.num_pages, 3)
+        kp.page(1)
+        kp.page(2)
+        self.assertEqual(kp.page(3).object_list, expected[6:])
+
+    def test_positional_orphans(self):
+        kp = KeysetPaginator(self.queryset, 3, 1)
+        self.assertEqual(kp.orphans, 1)
+        self.assertEqual(kp.num_pages, 3)
+
+    def test_queries(self):
+        expected = list(self.queryset.order_by('-name', 'pk'))
+
+        kp = KeysetPaginator(self.queryset, 3, count=10)
+        for number in kp.page_range:
+            with self.assertNumQueries(1):
+                page = kp.page(number)
+            start = (number - 1) * 3
+            self.assertEqual(page.object_list, expected[start:start + 3])
+
+        first = expected[3]
+        self.assertEqual(kp.bounds[2][0], (first.name, first.pk))
+
+    def test_page_links(self):
+        kp = KeysetPaginator(self.queryset, 1)
+        self.assertEqual(kp.page(5).page_links(), [None, 3, 4, 5, 6, 7, None])
+
+
 @override_settings(SOUTH_TESTS_MIGRATE=True)
 class BackupTestCase(TransactionTestCase):
     def test_fixture_dir(self):
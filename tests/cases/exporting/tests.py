@@ -1,10 +1,16 @@
 import os
+from zipfile import ZipFile, ZIP_DEFLATED
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.http import HttpResponse
+from cStringIO import StringIO
 from django.template import Template
 from django.core import management
 from avocado import export
+from avocado.formatters import Formatter
 from avocado.models import DataField, DataConcept, DataConceptField
+from avocado.export._base import BaseExporter
+from avocado.export._zip import write_file
 from . import models
 
 __all__ = ['FileExportTestCase', 'ResponseExportTestCase']
@@ -51,6 +57,144 @@ class FileExportTestCase(TestCase):
         buff.seek(0)
         self.assertEqual(len(buff.read()), 246)
 
+    def test_parallel(self):
+        rows = list(self.query)
+        # Duplicate rows across the chunk boundaries
+        rows = [rows[0]] + rows[:3] + [rows[2], rows[2]] + rows[3:]
+
+        exporter = export.CSVExporter(self.concepts)
+        buff = exporter.write(rows, workers=2, chunk_size=2)
+        self.assertEqual(buff.getvalue(), exporter.write(self.query).getvalue())
+
+        exporter = export.JSONExporter(self.concepts)
+        buff = exporter.write(rows, force_distinct=False, workers=3, chunk_size=1)
+        self.assertEqual(buff.getvalue(), exporter.write(rows,
+            force_distinct=False).getvalue())
+
+    @override_settings(AVOCADO_EXPORT_BUFFER_SIZE=100)
+    def test_iter_write(self):
+        for name in ('CSVExporter', 'JSONExporter'):
+            exporter = getattr(export, name)(self.concepts)
+            chunks = list(exporter.iter_write(self.query))
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual(''.join(chunks),
+                exporter.write(self.query).getvalue())
+
+        # Spooled to a temporary file
+        exporter = export.SASExporter(self.concepts)
+        buff = StringIO()
+        exporter.write(self.query, buff)
+        chunks = list(exporter.iter_write(self.query))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(len(''.join(chunks)), len(buff.getvalue()))
+
+        # Exporters must implement one or the other
+        exporter = BaseExporter(self.concepts)
+        self.assertRaises(NotImplementedError, exporter.write, self.query)
+        self.assertRaises(NotImplementedError, exporter.iter_write, self.query)
+
+    def test_read_batches(self):
+        calls = []
+        format_batch = Formatter.format_batch.im_func
+
+        def record(self, rows, *args, **kwargs):
+            calls.append(len(rows))
+            return format_batch(self, rows, *args, **kwargs)
+
+        # Each chunk of rows is formatted column-wise at once
+        Formatter.format_batch = record
+        try:
+            rows = list(export.CSVExporter(self.concepts).read(self.query,
+                chunk_size=4))
+        finally:
+            Formatter.format_batch = format_batch
+
+        self.assertEqual(sum(calls), len(rows))
+        self.assertEqual(calls[0], 4)
+        self.assertEqual(rows[0][0].keys(), ['first_name', 'last_name',
+            'is_manager', 'name', 'salary'])
+
+    def test_offsets(self):
+        title_field = DataField.objects.get_by_natural_key('exporting', 'title', 'name')
+        salary_field = DataField.objects.get_by_natural_key('exporting', 'title', 'salary')
+        first_name_field = DataField.objects.get_by_natural_key('exporting', 'employee', 'first_name')
+
+        title_concept = DataConcept(name='Title')
+        title_concept.save()
+        DataConceptField(concept=title_concept, field=title_field, order=1).save()
+        DataConceptField(concept=title_concept, field=salary_field, order=2).save()
+
+        name_concept = DataConcept(name='Name')
+        name_concept.save()
+        DataConceptField(concept=name_concept, field=first_name_field, order=1).save()
+
+        concepts = [title_concept, self.concepts[0], name_concept]
+        exporter = export.CSVExporter(concepts)
+        self.assertEqual([x[1:] for x in exporter.params],
+            [(0, 2), (2, 7), (7, 8)])
+        self.assertEqual(exporter.row_length, 8)
+
+        row = ('Programmer', 15000, 'Eric', 'Smith', False, 'Programmer',
+            15000, 'Eric', 'extra')
+        self.assertEqual([x.values() for x in exporter._format_rows([row])[0]], [
+            ['Programmer', 15000],
+            ['Eric', 'Smith', False, 'Programmer', 15000],
+            ['Eric'],
+        ])
+
+    def test_format_row_copies(self):
+        copied = []
+
+        class Row(tuple):
+            def __getslice__(self, start, stop):
+                value = super(Row, self).__getslice__(start, stop)
+                copied.append(len(value))
+                return value
+
+        # A wide view of 40 concepts only copies each value once
+        exporter = export.CSVExporter(self.concepts * 40)
+        row = Row(tuple(self.query[0]) * 40)
+        exporter._format_rows([row])
+        self.assertEqual(len(copied), 40)
+        self.assertEqual(sum(copied), len(row))
+
+    def test_zip(self):
+        data = export.CSVExporter(self.concepts).write(self.query).getvalue()
+
+        for compress_level in (0, 9):
+            with override_settings(AVOCADO_EXPORT_COMPRESS_LEVEL=compress_level):
+                for name in ('SASExporter', 'RExporter'):
+                    buff = StringIO()
+                    getattr(export, name)(self.concepts).write(self.query, buff)
+
+                    zip_file = ZipFile(StringIO(buff.getvalue()))
+                    self.assertEqual(zip_file.testzip(), None)
+                    self.assertEqual(zip_file.read('data.csv'), data)
+
+                    info = zip_file.getinfo('data.csv')
+                    self.assertEqual(info.compress_type == ZIP_DEFLATED,
+                        bool(compress_level))
+
+    @override_settings(AVOCADO_EXPORT_BUFFER_SIZE=1000)
+    def test_zip_chunks(self):
+        # The data is larger than the buffer so it is read and compressed in
+        # several chunks
+        data = ''.join(str(i) for i in xrange(5000))
+
+        buff = StringIO()
+        zip_file = ZipFile(buff, 'w')
+        write_file(zip_file, 'data.txt', StringIO(data), level=6)
+        zip_file.close()
+
+        zip_file = ZipFile(StringIO(buff.getvalue()))
+        self.assertEqual(zip_file.testzip(), None)
+        self.assertEqual(zip_file.read('data.txt'), data)
+
+        info = zip_file.getinfo('data.txt')
+        self.assertEqual(info.compress_type, ZIP_DEFLATED)
+        self.assertEqual(info.file_size, len(data))
+        self.assertTrue(info.compress_size < len(data))
+
     def test_excel(self):
         fname = 'excel_export.xlsx'
         exporter = export.ExcelExporter(self.concepts)
@@ -1,3 +1,5 @@
+import pickle
+from decimal import Decimal
 try:
     from collections import OrderedDict
 except ImportError:
@@ -5,6 +7,7 @@ except ImportError:
 from django.test import TestCase
 from django.core import management
 from avocado.models import DataField, DataConcept, DataConceptField
+from avocado.conf import OPTIONAL_DEPS
 from avocado.formatters import Formatter
 
 
@@ -91,3 +94,83 @@ class FormatterTestCase(TestCase):
             ('title__name', 'one'),
             ('project__name', 'two'),
         ]), f(['one', 'two']))
+
+    def test_plan(self):
+        calls = []
+
+        class CountingFormatter(Formatter):
+            def to_number(self, value, **context):
+                calls.append(value)
+                return super(CountingFormatter, self).to_number(value, **context)
+
+        f = CountingFormatter(self.concept)
+        fvalues = f(self.values, preferred_formats=['number', 'string'])
+        self.assertEqual(fvalues['name'], 'CEO')
+        self.assertEqual(fvalues['salary'], 100000)
+        self.assertEqual(len(calls), 3)
+
+        # Each method is called at most once per value, including for values
+        # that fall through to a later method
+        f(['CFO', 90000, False], preferred_formats=['number', 'string'])
+        self.assertEqual(len(calls), 6)
+
+        fvalues = f(['CTO', 'n/a', False], preferred_formats=['number', 'string'])
+        self.assertEqual(fvalues['salary'], u'n/a')
+        self.assertEqual(calls[-3:], ['CTO', 'n/a', False])
+        fvalues = f(['CTO', 120000, False], preferred_formats=['number', 'string'])
+        self.assertEqual(fvalues['salary'], 120000)
+        self.assertEqual(len(calls), 12)
+
+    def test_plan_mixed(self):
+        # A value that falls through to a later method does not prevent
+        # earlier methods from being used for other values of the same type
+        self.assertEqual(self.f(['abc'], ['number']).values(), ['abc'])
+        self.assertEqual(self.f(['123'], ['number']).values(), [123])
+        self.assertEqual(self.f(['abc'], ['number']).values(), ['abc'])
+
+        # Plans are not pickled
+        self.f(self.values)
+        self.assertTrue(self.f._plans)
+        self.assertEqual(pickle.loads(pickle.dumps(self.f))._plans, {})
+
+    def test_format_batch(self):
+        rows = [self.values, ['CFO', '90000', None], [None, Decimal('1.5'), False],
+            ['CTO', 2 ** 64, None]]
+
+        for formats in (['number', 'string'], ['boolean', 'number'], ['coded'],
+                ['string']):
+            columns = self.f.format_batch(rows, preferred_formats=formats)
+            self.assertEqual(columns.keys(), ['name', 'salary', 'boss'])
+            self.assertEqual(zip(*columns.values()),
+                [tuple(self.f(row, preferred_formats=formats).values())
+                    for row in rows])
+
+        columns = self.f.format_batch(rows, preferred_formats=['number'])
+        self.assertEqual(columns['salary'], [100000, 90000, 1.5, 2 ** 64])
+
+        # Longs are numbers whether formatted by row or column
+        self.assertEqual(self.f(['CTO', 2 ** 64, None],
+            preferred_formats=['number'])['salary'], 2 ** 64)
+        self.assertEqual(self.f.to_number(2 ** 64), 2 ** 64)
+
+    def test_format_batch_multiple(self):
+        class HtmlFormatter(Formatter):
+            def to_html(self, values, **context):
+                return '<b>{0}</b>'.format(values['name'])
+            to_html.process_multiple = True
+
+        f = HtmlFormatter(self.concept)
+        columns = f.format_batch([self.values, ['CFO', 90000, False]],
+            preferred_formats=['html'])
+        self.assertEqual(columns, OrderedDict([
+            ('Title', ['<b>CEO</b>', '<b>CFO</b>']),
+        ]))
+
+    def test_format_batch_arrays(self):
+        if not OPTIONAL_DEPS['numpy']:
+            return
+
+        columns = self.f.format_batch([self.values, ['CFO', 90000, False]],
+            preferred_formats=['number', 'string'], arrays=True)
+        self.assertEqual(columns['salary'].tolist(), [100000, 90000])
+        self.assertEqual(columns['name'], ['CEO', 'CFO'])
@@ -1,4 +1,6 @@
+from datetime import datetime
 from django.test import TestCase
+from avocado.formatters import Formatter
 from avocado.models import DataField, DataConcept, DataConceptField, DataView
 from .models import Month, Date
 
@@ -15,6 +17,43 @@ class LexiconTestCase(TestCase):
             u'October', u'November', u'December'))
         self.assertEqual(f.codes, (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11))
 
+    def test_iter_choices(self):
+        f = DataField(app_name='lexicon', model_name='month', field_name='id')
+        self.assertEqual(list(f.iter_values(chunk_size=5)), list(f.values))
+        self.assertEqual(list(f.iter_labels(chunk_size=5)), list(f.labels))
+        self.assertEqual(list(f.iter_choices(chunk_size=5)), f.choices)
+
+    def test_get_labels(self):
+        f = DataField(app_name='lexicon', model_name='month', field_name='id')
+        with self.assertNumQueries(1):
+            self.assertEqual(f.get_labels([1, 2, 13]),
+                {1: u'January', 2: u'February'})
+        self.assertEqual(f.get_label(12), u'December')
+
+    def test_get_code(self):
+        f = DataField(app_name='lexicon', model_name='month', field_name='id',
+            data_modified=datetime.now())
+        f.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(f.get_code(1), 0)
+            self.assertEqual(f.get_code(12), 11)
+        self.assertRaises(KeyError, f.get_code, 13)
+
+        # The mapping is shared by other instances of the field
+        other = DataField.objects.get(pk=f.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(other._get_code_index() is f._get_code_index())
+
+        concept = DataConcept()
+        concept.save()
+        DataConceptField(concept=concept, field=f).save()
+        formatter = Formatter(concept)
+        self.assertEqual(formatter([3], preferred_formats=['coded']),
+            {'id': 2})
+        self.assertEqual(formatter.format_batch([[3], [13]],
+            preferred_formats=['coded']), {'id': [2, 13]})
+        self.assertEqual(f.get_codes([3, 13]), {3: 2})
+
     def test_foreign_key_datafield(self):
         f = DataField(app_name='lexicon', model_name='date', field_name='month')
         self.assertTrue(f.lexicon)
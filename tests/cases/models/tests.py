@@ -1,3 +1,4 @@
+from datetime import datetime
 try:
     from collections import OrderedDict
 except ImportError:
@@ -5,9 +6,13 @@ except ImportError:
 from django.test import TestCase
 from django.core import management
 from django.core.cache import cache
+from django.test.utils import override_settings
 from django.contrib.auth.models import User
 from guardian.shortcuts import assign
 from avocado.models import DataField, DataCategory, DataConcept, DataConceptField
+from avocado.core.utils import iter_queryset
+from avocado.core.cache.model import MEMO_ATTR
+from .models import Title
 
 
 class ModelInstanceCacheTestCase(TestCase):
@@ -30,6 +35,145 @@ class ModelInstanceCacheTestCase(TestCase):
         queryset = DataField.objects.filter(pk=pk)
         self.assertEqual(queryset._result_cache[0].pk, pk)
 
+    def test_datafield_pk_in_cache(self):
+        cache.clear()
+
+        pks = list(DataField.objects.values_list('pk', flat=True)[:3])
+        pks.reverse()
+
+        # Only the first is cached, the rest are fetched and cached
+        DataField.objects.get(pk=pks[0]).save()
+
+        # Counting is done by the database without fetching the instances
+        queryset = DataField.objects.filter(pk__in=pks)
+        self.assertEqual(queryset.count(), 3)
+        self.assertEqual(queryset._result_cache, None)
+        self.assertEqual(cache.get_many([queryset._cache_key(x)
+            for x in pks[1:]]), {})
+
+        with self.assertNumQueries(1):
+            queryset = DataField.objects.filter(pk__in=pks)
+            self.assertEqual([x.pk for x in queryset], pks)
+
+        with self.assertNumQueries(0):
+            queryset = DataField.objects.filter(pk__in=pks)
+            self.assertEqual([x.pk for x in queryset], pks)
+
+        # Additional conditions are not resolved from the cache
+        queryset = DataField.objects.filter(pk__in=pks, published=True)
+        self.assertEqual(queryset._result_cache, None)
+
+    @override_settings(AVOCADO_LOCAL_CACHE_ENABLED=True)
+    def test_local_cache(self):
+        from avocado.core.cache import local_cache, incr_generation
+        cache.clear()
+        local_cache.clear()
+
+        self.is_manager.data_modified = datetime.now()
+        values = self.is_manager.values
+        key = DataField.values.get_key(self.is_manager)
+        self.assertTrue(key in local_cache)
+
+        # Served from the local cache even if the backend is cleared since
+        # the generation is retained locally as well
+        cache.clear()
+        hits = local_cache.hits
+        with self.assertNumQueries(0):
+            self.assertEqual(self.is_manager.values, values)
+        self.assertEqual(local_cache.hits, hits + 1)
+
+        # Incrementing the generation in this process applies immediately
+        incr_generation(self.is_manager.model_label)
+        self.assertNotEqual(DataField.values.get_key(self.is_manager), key)
+        local_cache.clear()
+
+    def test_generation(self):
+        from avocado.core.cache import incr_generation
+        cache.clear()
+
+        self.is_manager.data_modified = datetime.now()
+        key = DataField.values.get_key(self.is_manager)
+        self.is_manager.values
+
+        with self.assertNumQueries(0):
+            self.is_manager.values
+
+        # Invalidates all data derived from the model
+        incr_generation(self.is_manager.model_label)
+        self.assertNotEqual(DataField.values.get_key(self.is_manager), key)
+
+        with self.assertNumQueries(1):
+            self.is_manager.values
+
+        # The generation is retained by the process even without the local
+        # cache, so it is not fetched from the backend on each access
+        key = DataField.values.get_key(self.is_manager)
+        cache.clear()
+        self.assertEqual(DataField.values.get_key(self.is_manager), key)
+
+    @override_settings(AVOCADO_CACHE_STAMPEDE_POLICY='stale')
+    def test_stampede_stale(self):
+        cache.clear()
+
+        self.is_manager.data_modified = datetime(2013, 1, 1)
+        values = self.is_manager.values
+
+        # Another process is computing the next version
+        self.is_manager.data_modified = datetime(2013, 1, 2)
+        key = DataField.values.get_key(self.is_manager)
+        cache.add(key + '-lock', 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.is_manager.values, values)
+
+        # Nothing is cached for the new version yet
+        self.assertEqual(cache.get(key), None)
+
+    @override_settings(AVOCADO_CACHE_STAMPEDE_POLICY='wait',
+        AVOCADO_CACHE_LOCK_WAIT=0.2, AVOCADO_CACHE_LOCK_INTERVAL=0.05)
+    def test_stampede_wait(self):
+        cache.clear()
+
+        self.is_manager.data_modified = datetime(2013, 1, 1)
+        key = DataField.values.get_key(self.is_manager)
+        cache.add(key + '-lock', 1)
+
+        # Gives up waiting on the lock and computes the data
+        with self.assertNumQueries(1):
+            values = self.is_manager.values
+        self.assertEqual(cache.get(key), values)
+
+        # The lock is acquired and released once computed
+        cache.delete(key + '-lock')
+        cache.delete(key)
+        with self.assertNumQueries(1):
+            self.is_manager.values
+        self.assertEqual(cache.get(key + '-lock'), None)
+
+    def test_prefetch_cached(self):
+        cache.clear()
+
+        DataField.objects.update(data_modified=datetime.now())
+        fields = list(DataField.objects.prefetch_cached('size', 'values'))
+
+        keys = []
+        for f in fields:
+            keys.append(DataField.size.get_key(f))
+            keys.append(DataField.values.get_key(f))
+        self.assertEqual(len(cache.get_many(keys)), len(keys))
+
+        # Prefetched data is read from the instance
+        cache.clear()
+        with self.assertNumQueries(0):
+            for f in fields:
+                f.size
+                f.values
+
+        # Resolved from the cache when already present
+        fields = list(DataField.objects.prefetch_cached('size'))
+        with self.assertNumQueries(1):
+            list(DataField.objects.prefetch_cached('size'))
+
 
 class DataFieldTestCase(TestCase):
     fixtures = ['models.json']
@@ -58,6 +202,70 @@ class DataFieldTestCase(TestCase):
         self.assertEqual(self.first_name.simple_type, 'string')
         self.assertEqual(self.first_name.nullable, False)
 
+    def test_descriptor(self):
+        descriptor = self.salary.descriptor
+        self.assertTrue(self.salary.descriptor is descriptor)
+        self.assertEqual(descriptor.model, Title)
+        self.assertEqual(descriptor.field, Title._meta.get_field('salary'))
+        self.assertEqual(descriptor.internal_type, 'integer')
+        self.assertEqual(descriptor.simple_type, 'number')
+        self.assertFalse(descriptor.lexicon)
+
+        # Invalidated when saved
+        self.salary.save()
+        self.assertFalse(self.salary.descriptor is descriptor)
+        self.assertEqual(self.salary.descriptor, descriptor)
+
+        # Unknown models are not retained
+        unknown = DataField(app_name='models', model_name='unknown',
+            field_name='name')
+        self.assertEqual(unknown.model, None)
+        self.assertEqual(unknown.simple_type, None)
+
+    def test_iter_values(self):
+        for i, name in enumerate(['Programmer', 'Analyst', 'Manager']):
+            Title(name=name, salary=i * 1000).save()
+
+        name = DataField.objects.get_by_natural_key('models', 'title', 'name')
+        self.assertEqual(list(name.iter_values(chunk_size=2)),
+            ['Analyst', 'Manager', 'Programmer'])
+        self.assertEqual(list(name.iter_labels(chunk_size=2)),
+            [u'Analyst', u'Manager', u'Programmer'])
+        self.assertEqual(list(self.salary.iter_choices()),
+            [(0, u'0'), (1000, u'1000'), (2000, u'2000')])
+
+        # Nothing to iterate over
+        values_list = name.values_list
+        self.assertEqual(list(iter_queryset(values_list.none())), [])
+        self.assertEqual(list(iter_queryset(values_list.filter(pk__in=[]))), [])
+
+    def test_get_labels(self):
+        Title(name='Programmer', boss=False).save()
+        Title(name='Manager', boss=True).save()
+
+        cache.clear()
+        boss = DataField.objects.get_by_natural_key('models', 'title', 'boss')
+        self.assertEqual(boss.get_label(True), u'True')
+
+        # The index is resolved once per instance
+        with self.assertNumQueries(0):
+            self.assertEqual(boss.get_labels([True, False, 'x']),
+                {True: u'True', False: u'False'})
+
+        self.assertRaises(KeyError, boss.get_label, 'x')
+
+        # Searchable fields are not indexed
+        name = DataField.objects.get_by_natural_key('models', 'title', 'name')
+        name.enumerable = False
+        self.assertTrue(name.searchable)
+        self.assertEqual(name.get_labels(['Manager', 'Boss']),
+            {'Manager': u'Manager', 'Boss': u'Boss'})
+
+        # The memoized index is not cached with the instance
+        boss.save()
+        boss = DataField.objects.get(pk=boss.pk)
+        self.assertFalse(hasattr(boss, MEMO_ATTR))
+
 
 class DataFieldManagerTestCase(TestCase):
     fixtures = ['models.json']
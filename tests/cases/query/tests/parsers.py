@@ -1,8 +1,10 @@
+from datetime import datetime
 from django.test import TestCase
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core import management
 from avocado.query import parsers
-from avocado.models import DataConcept, DataField, DataConceptField
+from avocado.models import DataConcept, DataField, DataConceptField, DataContext
 from ..models import Employee
 
 
@@ -126,6 +128,74 @@ class DataContextParserTestCase(TestCase):
         })
 
 
+class DataContextCacheTestCase(TestCase):
+    fixtures = ['query.json']
+
+    def setUp(self):
+        management.call_command('avocado', 'init', 'query', quiet=True)
+        DataField.objects.update(data_modified=datetime.now())
+        cache.clear()
+
+    def test_canonicalize(self):
+        c1 = parsers.datacontext.canonicalize({
+            'type': 'AND',
+            'children': [{
+                'id': 'query.employee.first_name',
+                'operator': 'in',
+                'value': ['John', {'value': 'Erick', 'label': 'Erick'}, 'John'],
+            }, {
+                'id': 4,
+                'operator': 'exact',
+                'value': True,
+            }]
+        })
+
+        c2 = parsers.datacontext.canonicalize({
+            'type': 'and',
+            'children': [{
+                'id': ['query', 'title', 'boss'],
+                'operator': 'exact',
+                'value': True,
+            }, {
+                'id': 5,
+                'operator': 'in',
+                'value': ['Erick', 'John'],
+            }]
+        })
+
+        self.assertEqual(c1, c2)
+
+    def test_count(self):
+        c1 = DataContext(json={
+            'id': 4,
+            'operator': 'exact',
+            'value': True,
+        })
+        c2 = DataContext(json={
+            'id': 'query.title.boss',
+            'operator': 'exact',
+            'value': True,
+        })
+
+        self.assertEqual(c1.cache_key('count', tree=Employee),
+            c2.cache_key('count', tree=Employee))
+
+        count = c1.get_count(tree=Employee)
+        self.assertEqual(count, c1.apply(tree=Employee).count())
+
+        # Identical context is served from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(c2.get_count(tree=Employee), count)
+
+        self.assertEqual(sorted(c2.get_pks(tree=Employee)),
+            sorted(c2.apply(tree=Employee).values_list('pk', flat=True)))
+
+        # Modifying the data changes the key
+        key = c1.cache_key('count', tree=Employee)
+        DataField.objects.update(data_modified=datetime.now())
+        self.assertNotEqual(c1.cache_key('count', tree=Employee), key)
+
+
 class DataViewParserTestCase(TestCase):
     fixtures = ['query.json']
 
@@ -2,6 +2,8 @@ from django.test import TestCase
 from django.core import management
 from django.core.exceptions import ValidationError
 from avocado.models import DataField
+from avocado.core.cache.model import MEMO_ATTR
+from avocado.query.translators import Translator, translate_many, validate_many
 from ..models import Employee
 
 
@@ -57,3 +59,80 @@ class TranslatorTestCase(TestCase):
         trans = self.salary.translate(value=False, operator='isnull', tree=Employee)
         self.assertEqual(str(trans['query_modifiers']['condition']), "(AND: ('title__salary__isnull', False), ('title__id__isnull', False))")
 
+    def test_translate_many(self):
+        results = translate_many([
+            {'id': self.salary.pk, 'value': 50000},
+            {'id': 'query.employee.first_name', 'value': False, 'operator': 'isnull'},
+            {'id': ['query', 'employee', 'first_name'], 'value': 'Robert'},
+            {'id': 9999, 'value': 1},
+            {'id': self.salary.pk, 'value': 30000, 'operator': 'lt'},
+        ], tree=Employee)
+
+        self.assertEqual(str(results[0]['query_modifiers']['condition']), "(AND: ('title__salary__exact', 50000.0))")
+        self.assertEqual(str(results[2]['query_modifiers']['condition']), "(AND: ('first_name__exact', u'Robert'))")
+        self.assertEqual(str(results[4]['query_modifiers']['condition']), "(AND: ('title__salary__lt', 30000.0))")
+
+        # Invalid conditions do not affect the others
+        self.assertEqual(results[1]['id'], 'query.employee.first_name')
+        self.assertTrue(results[1]['errors'])
+        self.assertEqual(results[3]['id'], 9999)
+        self.assertTrue(results[3]['errors'])
+
+    def test_translate_many_errors(self):
+        results = translate_many([
+            {'value': 50000},
+            {'id': 'query.employee', 'value': 1},
+            {'id': {'app_name': 'query'}, 'value': 1},
+            {'id': self.salary.pk, 'value': 50000, 'operator': ['gt']},
+            {'id': self.salary.pk, 'value': 50000, 'operator': 'foo'},
+            {'id': self.salary.pk, 'value': 50000},
+        ], tree=Employee)
+
+        for result in results[:5]:
+            self.assertTrue(result['errors'])
+        self.assertEqual(results[0]['id'], None)
+        self.assertEqual(str(results[5]['query_modifiers']['condition']), "(AND: ('title__salary__exact', 50000.0))")
+
+    def test_translate_many_grouped(self):
+        conditions = [
+            {'id': self.salary.pk, 'value': 50000},
+            {'id': 'query.title.salary', 'value': 60000},
+            {'id': ['query', 'title', 'salary'], 'value': 70000},
+        ]
+        # The conditions share a single instance of the field
+        fields = []
+        translate = Translator.translate.im_func
+
+        def record(self, field, *args, **kwargs):
+            fields.append(field)
+            return translate(self, field, *args, **kwargs)
+
+        Translator.translate = record
+        try:
+            results = translate_many(conditions, tree=Employee)
+        finally:
+            Translator.translate = translate
+
+        self.assertEqual(len(fields), 3)
+        self.assertTrue(fields[0] is fields[1] is fields[2])
+        self.assertEqual([str(x['query_modifiers']['condition']) for x in results], [
+            "(AND: ('title__salary__exact', 50000.0))",
+            "(AND: ('title__salary__exact', 60000.0))",
+            "(AND: ('title__salary__exact', 70000.0))",
+        ])
+
+    def test_validate_many(self):
+        results = validate_many([
+            {'id': self.salary.pk, 'value': ['50000', '60000'], 'operator': 'range'},
+            {'id': self.salary.pk, 'value': 'foo'},
+        ], tree=Employee)
+
+        self.assertEqual(results[0][1], [50000.0, 60000.0])
+        self.assertTrue(results[1]['errors'])
+
+    def test_memo_not_saved(self):
+        self.salary.translate(value=50000, tree=Employee)
+        self.assertTrue(getattr(self.salary, MEMO_ATTR))
+        self.salary.save()
+        field = DataField.objects.get(pk=self.salary.pk)
+        self.assertFalse(hasattr(field, MEMO_ATTR))
@@ -1,2 +1,3 @@
 from .agg import *
 from .cluster import *
+from .hll import *
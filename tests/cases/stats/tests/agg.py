@@ -1,7 +1,9 @@
 import unittest
+from datetime import date, datetime
 from django.test import TestCase
 from django.core import management
-from avocado.models import DataField
+from avocado.models import DataField, DataContext
+from ..models import Employee, Project
 
 
 class AggregatorTestCase(TestCase):
@@ -49,3 +51,72 @@ class AggregatorTestCase(TestCase):
         self.assertEqual(self.is_manager.variance(), None)
         self.assertEqual(self.salary.variance(), [{'variance': 4440816326.530612}])
         self.assertEqual(self.first_name.variance(), None)
+
+    def test_summary(self):
+        self.assertEqual(self.salary.summary(), [{'count': 7,
+            'distinct_count': 5, 'null_count': 0, 'min': 10000, 'max': 200000,
+            'avg': 53571.42857142857, 'sum': 375000}])
+
+        # Non-numeric fields
+        self.assertEqual(self.first_name.summary(), [{'count': 6,
+            'distinct_count': 6, 'null_count': 0, 'min': 'Aaron', 'max': 'Zac'}])
+
+        summary = self.salary.summary('boss')
+        self.assertEqual([(x['values'], x['count'], x['max']) for x in summary],
+            [([False], 6, 100000), ([True], 1, 200000)])
+
+        boss = DataField.objects.get_by_natural_key('stats', 'title', 'boss')
+        context = DataContext(json={'id': boss.pk, 'operator': 'exact',
+            'value': True})
+        summary = self.salary.summary(context=context)
+        self.assertEqual((summary[0]['count'], summary[0]['min']), (1, 200000))
+
+    def test_summary_cache(self):
+        self.salary.data_modified = datetime.now()
+        self.salary.save()
+
+        summary = self.salary.summary()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.salary.summary(), summary)
+
+    def test_bin_width(self):
+        bins = self.salary.histogram(bins=4)
+        self.assertEqual([x['count'] for x in bins], [5, 1, 0, 1])
+        self.assertEqual((bins[0]['start'], bins[-1]['end']), (10000, 200000))
+        self.assertEqual(self.first_name.histogram(), None)
+
+        # Every value falls in one of the bins
+        total = self.salary.count()[0]['count']
+        for n in (3, 7, 11):
+            bins = self.salary.histogram(bins=n)
+            self.assertEqual(len(bins), n)
+            self.assertEqual(sum(x['count'] for x in bins), total)
+
+    def test_bin_quantile(self):
+        bins = self.salary.histogram(bins=3, method='quantile')
+        self.assertEqual([(x['start'], x['end'], x['count']) for x in bins],
+            [(10000, 15000, 1), (15000, 20000, 3), (20000, 200000, 3)])
+
+    def test_bin_date(self):
+        employees = list(Employee.objects.all()[:4])
+        due_dates = [date(2012, 1, 3), date(2012, 1, 5), date(2012, 1, 10),
+            date(2012, 3, 1)]
+        for employee, due_date in zip(employees, due_dates):
+            Project(name='Project', manager=employee, due_date=due_date).save()
+
+        due_date = DataField.objects.get_by_natural_key('stats', 'project',
+            'due_date')
+
+        self.assertEqual(due_date.histogram(), [
+            {'start': date(2012, 1, 1), 'end': date(2012, 2, 1), 'count': 3},
+            {'start': date(2012, 3, 1), 'end': date(2012, 4, 1), 'count': 1},
+        ])
+        self.assertEqual([(x['start'], x['count']) for x in
+            due_date.histogram(method='week')], [(date(2012, 1, 2), 2),
+            (date(2012, 1, 9), 1), (date(2012, 2, 27), 1)])
+        self.assertRaises(ValueError, due_date.histogram, method='hour')
+
+        # The method must apply to the type of field
+        self.assertRaises(ValueError, due_date.histogram, method='width')
+        self.assertRaises(ValueError, due_date.histogram, method='quantile')
+        self.assertRaises(ValueError, self.salary.histogram, method='month')
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from django.test import TestCase
+from django.core import management
+from django.test.utils import override_settings
+from avocado.models import DataField
+from avocado.stats.hll import HyperLogLog
+
+__all__ = ('HyperLogLogTestCase',)
+
+
+class HyperLogLogTestCase(TestCase):
+    fixtures = ['stats.json']
+
+    def test_count(self):
+        sketch = HyperLogLog(0.01)
+        self.assertEqual(sketch.precision, 14)
+        self.assertEqual(len(sketch), 0)
+
+        sketch.update(range(20000))
+        # Duplicates do not affect the estimate
+        sketch.update(range(10000))
+        self.assertTrue(abs(len(sketch) - 20000) < 20000 * sketch.error * 3)
+
+        small = HyperLogLog(0.05)
+        # Nulls are not counted, like COUNT(DISTINCT)
+        small.update(['a', 'b', 'c', None, 'a'])
+        self.assertEqual(len(small), 3)
+
+    def test_normalize(self):
+        a = HyperLogLog(0.05)
+        a.update([1, 'a', 2.0, Decimal('3')])
+        b = HyperLogLog(0.05)
+        b.update([1L, u'a', 2, 3.0])
+        self.assertEqual(a.registers, b.registers)
+        self.assertEqual(len(a | b), 4)
+
+        c = HyperLogLog(0.05)
+        c.update([1.5, Decimal('1.5'), '1', float('inf')])
+        self.assertEqual(len(c), 3)
+
+    def test_merge(self):
+        a = HyperLogLog(0.02)
+        a.update(range(0, 6000))
+        b = HyperLogLog(0.02)
+        b.update(range(4000, 10000))
+
+        union = HyperLogLog(0.02)
+        union.update(range(10000))
+
+        self.assertEqual((a | b).registers, union.registers)
+        self.assertEqual(a.merge(b).registers, union.registers)
+
+        self.assertRaises(ValueError, a.merge, HyperLogLog(0.1))
+
+    def test_datafield(self):
+        management.call_command('avocado', 'init', 'stats', quiet=True)
+        salary = DataField.objects.get_by_natural_key('stats', 'title', 'salary')
+
+        self.assertEqual(salary.size_estimate, salary.size)
+
+        with override_settings(AVOCADO_SIZE_ESTIMATE_ENABLED=True):
+            self.assertEqual(len(salary), salary.size_estimate)
+
+        # Sketches of partitions
+        titles = salary.model.objects.all()
+        sketch = salary.get_sketch(titles.filter(boss=True))
+        sketch.merge(salary.get_sketch(titles.exclude(boss=True)))
+        self.assertEqual(len(sketch), salary.size)
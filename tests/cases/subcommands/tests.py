@@ -1,8 +1,15 @@
 import os
 import sys
+import shutil
+import tempfile
+from cStringIO import StringIO
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.core import management
-from avocado.models import DataContext, DataView
+from django.core.cache import cache
+from avocado.models import DataContext, DataView, DataField
+from avocado.core.index import get_index
+from avocado.management.subcommands.cache import is_cached
 
 
 class CommandsTestCase(TestCase):
@@ -18,8 +25,92 @@ class CommandsTestCase(TestCase):
     def test_subcommands(self):
         management.call_command('avocado', 'init', 'subcommands')
         management.call_command('avocado', 'cache', 'subcommands')
+        management.call_command('avocado', 'cache', 'subcommands', only_missing=True)
+        management.call_command('avocado', 'cache', 'subcommands', workers=2)
         management.call_command('avocado', 'check')
         management.call_command('avocado', 'data', 'subcommands', update_data_modified=True)
+        management.call_command('avocado', 'data', 'subcommands', update_generation=True)
+
+    def test_cache(self):
+        from datetime import datetime
+
+        management.call_command('avocado', 'init', 'subcommands')
+        DataField.objects.update(data_modified=datetime.now())
+        cache.clear()
+
+        try:
+            management.call_command('avocado', 'cache', 'subcommands')
+            fields = DataField.objects.filter(app_name='subcommands',
+                enumerable=True)
+            self.assertTrue(fields.exists())
+            for f in fields:
+                self.assertNotEqual(cache.get(DataField.values.get_key(f)), None)
+                self.assertNotEqual(cache.get(DataField.label_index.get_key(f)),
+                    None)
+                self.assertTrue(is_cached(f))
+
+            # Warmed fields are skipped
+            stdout = sys.stdout
+            sys.stdout = StringIO()
+            try:
+                management.call_command('avocado', 'cache', 'subcommands',
+                    only_missing=True)
+                output = sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+            self.assertTrue(output.startswith('0 DataFields'))
+        finally:
+            cache.clear()
+
+    def test_index(self):
+        management.call_command('avocado', 'init', 'subcommands')
+        name = DataField.objects.get_by_natural_key('subcommands', 'title', 'name')
+        name.enumerable = False
+        name.save()
+
+        # No index, falls back to querying the table
+        self.assertEqual(list(name.search('a')),
+            ['Analyst', 'Guard', 'Lawyer', 'Programmer', 'QA'])
+
+        dirname = tempfile.mkdtemp()
+        try:
+            with override_settings(AVOCADO_VALUE_INDEX_DIR=dirname):
+                management.call_command('avocado', 'index', 'subcommands')
+                self.assertEqual(len(os.listdir(dirname)), 1)
+
+                self.assertEqual(list(name.search('an')), ['Analyst'])
+                # Prefix matches first, then by position of the match
+                self.assertEqual(list(name.search('a')),
+                    ['Analyst', 'QA', 'Lawyer', 'Guard', 'Programmer'])
+                self.assertEqual(list(name.search('a', limit=2)),
+                    ['Analyst', 'QA'])
+                # Short queries use the index rather than scanning it
+                index = get_index(name)
+                self.assertEqual([index.values[i]
+                    for i in index._candidates('qa')], ['QA'])
+                self.assertEqual(list(index._candidates('zz')), [])
+
+                # A new version is rebuilt and replaces the previous one
+                management.call_command('avocado', 'data', 'subcommands',
+                    update_data_modified=True)
+                name = DataField.objects.get(pk=name.pk)
+                management.call_command('avocado', 'index',
+                    'subcommands.title.name')
+                self.assertEqual(len(os.listdir(dirname)), 1)
+
+                # Incrementing the generation invalidates the index
+                filenames = os.listdir(dirname)
+                management.call_command('avocado', 'data', 'subcommands',
+                    update_generation=True)
+                self.assertEqual(get_index(name), None)
+                management.call_command('avocado', 'index',
+                    'subcommands.title.name')
+                self.assertNotEqual(os.listdir(dirname), filenames)
+                self.assertEqual(len(os.listdir(dirname)), 1)
+        finally:
+            shutil.rmtree(dirname)
+            # Saved instances are cached by primary key
+            cache.clear()
 
     def test_legacy(self):
         from avocado.models import DataField